@@ -0,0 +1,166 @@
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# The solvers are flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_perim
+import connections
+import tangram
+from benchmarks.corpus import TIERS, NUMBERLINK, PERIMETER, TANGRAM
+from grid import Grid
+from numberlink import LinkSolver
+from stats import SearchStats
+
+# Each runner solves one corpus entry and returns its number of solutions,
+# counting its search nodes in stats when one is given
+
+def run_numberlink(grid_str, engine, stats=None):
+    if engine == 'propagate':
+        solver = LinkSolver(Grid(grid_str), stats)
+        return sum(1 for _ in solver.search())
+    result = connections.solve_numberlink(grid_str, engine=engine, stats=stats)
+    return result['solution_count']
+
+def run_tangram(board, pieces, limit, stats=None):
+    result = tangram.solve_tangram(board, pieces, limit=limit, count_only=limit is None, stats=stats)
+    return result['solution_count']
+
+def run_perimeter(grid_str, label, stats=None):
+    # The map check_perim.main prints: every traversable cell on the
+    # perimeter is marked with '@'. Each cell of the grid counts as a node.
+    grid, pairs, labels = check_perim.parse_grid(grid_str)
+    marked = check_perim.perimeter_map(grid, pairs, label)
+    if stats is not None:
+        stats.count('nodes', len(grid) * len(grid[0]))
+    return sum(row.count('@') for row in marked)
+
+def corpus_cases(solvers, tiers):
+    # Yield (name, solver, tier, run) for the selected part of the corpus
+    for tier in tiers:
+        if 'numberlink' in solvers:
+            for i, (grid_str, engine) in enumerate(NUMBERLINK[tier]):
+                yield f"numberlink/{tier}/{i}-{engine}", 'numberlink', tier, lambda stats=None, grid_str=grid_str, engine=engine: run_numberlink(grid_str, engine, stats)
+        if 'perimeter' in solvers:
+            for i, (grid_str, label) in enumerate(PERIMETER[tier]):
+                yield f"perimeter/{tier}/{i}-{label or 'grid'}", 'perimeter', tier, lambda stats=None, grid_str=grid_str, label=label: run_perimeter(grid_str, label, stats)
+        if 'tangram' in solvers:
+            for i, (board, pieces, limit) in enumerate(TANGRAM[tier]):
+                mode = 'count' if limit is None else f"limit{limit}"
+                yield f"tangram/{tier}/{i}-{mode}", 'tangram', tier, lambda stats=None, board=board, pieces=pieces, limit=limit: run_tangram(board, pieces, limit, stats)
+
+def measure(run, repeat, budget):
+    # Best wall time over up to repeat runs, stopping early once budget
+    # seconds have been spent, then one more run under tracemalloc for the
+    # peak memory and one collecting SearchStats for the node count. The
+    # collector is paused while timing, as timeit does.
+    times = []
+    while len(times) < repeat and (not times or sum(times) < budget):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            solutions = run()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    stats = SearchStats()
+    run(stats)
+    nodes = stats.counters.get('nodes')
+
+    seconds = min(times)
+    return {
+        'seconds': seconds,
+        'runs': len(times),
+        'solutions': solutions,
+        'nodes': nodes,
+        'nodes_per_second': nodes / seconds if nodes is not None and seconds > 0 else None,
+        'peak_bytes': peak,
+    }
+
+def compare(results, baseline, threshold, min_seconds, min_bytes):
+    # Returns the regressions as (name, metric, old, new): a case is slower
+    # or bigger when it grew by more than threshold and by more than the
+    # noise floor of min_seconds or min_bytes
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result['seconds'] > old['seconds'] * (1 + threshold) and result['seconds'] - old['seconds'] > min_seconds:
+            regressions.append((name, 'seconds', old['seconds'], result['seconds']))
+        if result['peak_bytes'] > old['peak_bytes'] * (1 + threshold) and result['peak_bytes'] - old['peak_bytes'] > min_bytes:
+            regressions.append((name, 'peak_bytes', old['peak_bytes'], result['peak_bytes']))
+        if result['solutions'] != old['solutions']:
+            regressions.append((name, 'solutions', old['solutions'], result['solutions']))
+    return regressions
+
+def format_rate(rate):
+    return '-' if rate is None else f"{rate:,.0f}"
+
+def main():
+    from cli import CustomArgumentParser
+
+    parser = CustomArgumentParser(description='Benchmark the Numberlink, perimeter map and tangram solvers')
+    parser.add_argument('-s', '--solver', nargs='*', choices=['numberlink', 'perimeter', 'tangram'], default=['numberlink', 'perimeter', 'tangram'], help="Solvers to benchmark (default: all)")
+    parser.add_argument('-t', '--tier', nargs='*', choices=TIERS, default=TIERS, help="Corpus tiers to run (default: all)")
+    parser.add_argument('-r', '--repeat', type=int, default=5, help="Maximum timed runs per case; the best is kept (default: 5)")
+    parser.add_argument('--budget', type=float, default=2.0, help="Stop repeating a case once this many seconds were spent on it (default: 2)")
+    parser.add_argument('-o', '--output', type=str, help="Save the results to this JSON file")
+    parser.add_argument('-c', '--compare', type=str, help="Baseline JSON file to check the results against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Relative slowdown or memory growth reported as a regression (default: 0.25)")
+    parser.add_argument('--min-seconds', type=float, default=0.002, help="Time differences below this are noise (default: 0.002)")
+    parser.add_argument('--min-bytes', type=int, default=65536, help="Peak memory differences below this are noise (default: 65536)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    print(f"{'case':<34} {'seconds':>10} {'runs':>4} {'nodes/s':>12} {'peak KiB':>10} {'solutions':>9}")
+    for name, solver, tier, run in corpus_cases(args.solver, args.tier):
+        result = measure(run, args.repeat, args.budget)
+        result.update(solver=solver, tier=tier)
+        results[name] = result
+        line = f"{name:<34} {result['seconds']:>10.4f} {result['runs']:>4} {format_rate(result['nodes_per_second']):>12} {result['peak_bytes'] / 1024:>10.1f} {result['solutions']:>9}"
+        if baseline is not None and name in baseline:
+            line += f"  ({result['seconds'] / baseline[name]['seconds']:.2f}x baseline)" if baseline[name]['seconds'] else ""
+        print(line, flush=True)
+
+    if args.output:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.min_seconds, args.min_bytes)
+        for name, metric, old, new in regressions:
+            print(f"Regression: {name} {metric} {old} -> {new}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import random
+
+# Fixed benchmark corpus, in tiers of increasing size. Perimeter grids come
+# from a seeded generator that only draws random(), so every run and Python
+# version sees the same cells.
+
+TIERS = ['small', 'medium', 'large']
+
+# (grid string, engine) for connections.solve_numberlink
+NUMBERLINK = {
+    'small': [
+        ('A,2,B.4.1,C,2.A,C,1,B', 'enumerate'),
+        ('1,B,A,1,A.B,C,3.5.1,C,D,2.2,D,2', 'enumerate'),
+        ('6.1,E,D,3.6.3,B,A,1.B,E,D,C,A,1.C,5', 'enumerate'),
+        ('6.1,E,D,3.6.3,B,A,1.B,E,D,C,A,1.C,5', 'propagate'),
+    ],
+    'medium': [
+        ('1,C,D,4.5,E,D.7.1,A,B,4.B,1,C,2,E,F.A,4,F,1.7', 'enumerate'),
+        ('D,C,4,G.7.4,C,B,1.1,A,A,B,3.D,E,1,E,F,G,1.3,F,3.7', 'enumerate'),
+        ('7.7.3,F,E,2.5,B,E.2,F,2,A,D.5,A,D.1,B,C,3,C', 'propagate'),
+        ('1,B,A,1,G,3.B,3,H,3.C,A,6.1,D,E,1,E,H,2.4,F,3.5,F,G,1.D,C,6.8', 'propagate'),
+    ],
+    'large': [
+        ('7.7.3,F,E,2.5,B,E.2,F,2,A,D.5,A,D.1,B,C,3,C', 'enumerate'),
+        ('D,6.C,4,F,F.6,E.1,D,5.1,E,5.7.C,B,2,B,A,A', 'propagate'),
+    ],
+}
+
+# (board string, piece strings, limit) for tangram.solve_tangram; limit None
+# counts every solution
+TANGRAM = {
+    'small': [
+        ('4.4', ['1', '3', '2', '1.1'], None),
+        ('5.5.5.5.5', ['3,-1.-2,2', '-1,1.2.2.-1,1', '3,-1.4', '2', '2,-1.3'], 1),
+        ('6.6.6.6.6.6', ['4.-1,3', '2', '3', '3.-1,2', '3.2,-1.2,-1', '2,-2.4.4', '2'], None),
+    ],
+    'medium': [
+        ('8.8.8.8.8.8.8.8', ['2', '3', '1,-1,1,-1.4.4', '3.3.3', '4.-1,3.-2,1,-1', '5.5.-2,3.-4,1.-4,1.-4,1', '1.1.1', '2', '1,-2.3.2,-1', '2.-1,1', '1.1'], None),
+        ('8.8.8.8.8.8.8.8', ['1', '-1,1,-1.-1,1,-1.3.1,-1,1', '-2,2.4', '1.1.1', '-1,2,-1.4.-1,3', '1,-2.3.2,-1', '3.-1,2.-1,2', '2', '-1,1,-2.4.3,-1.3,-1.-2,1,-1', '1.1', '3.2,-1.2,-1.1,-2.1,-2'], None),
+    ],
+    'large': [
+        ('9.9.9.9.9.9.9.9.9', ['-3,1.4.-1,3', '3,-1.4.4.-1,2,-1', '3.-1,2.-1,2.3', '2', '1.1', '1', '1.1.1.1', '1.1', '-1,1,-1.-1,1,-1.3.3', '2.1,-1.1,-1', '3.-1,2.-1,2', '1,-1.2.2', '3.3.3.3.3'], None),
+        ('9.9.9.9.9.9.9.9.9', ['1.1.1.1.1', '5.-1,2,-2', '2.2.2.2.1,-1.1,-1', '2.-1,1.2', '-2,1.-2,1.-2,1.-1,2.3', '2.2.1,-1', '-2,1.-1,2.3', '-2,2.3,-1', '1,-1,1.3.1,-2', '1,-2.2,-1.3.-1,1,-1', '-1,1.2.1,-1', '-1,3.3,-1.3,-1.-1,1,-2', '1.1.1'], None),
+    ],
+}
+
+def wall_grid(rows, cols, density, seed):
+    # A rows x cols grid string with about density of its cells walls and
+    # pairs A and B placed on fixed cells
+    rng = random.Random(seed)
+    cells = [['1' if rng.random() >= density else '-1' for _ in range(cols)] for _ in range(rows)]
+    cells[rows // 3][1] = cells[2 * rows // 3][cols - 2] = 'A'
+    cells[1][cols // 2] = cells[rows - 2][cols // 3] = 'B'
+    return '.'.join(','.join(row) for row in cells)
+
+# (grid string, label) for check_perim perimeter maps; label None maps the
+# grid as it is, a label also treats that pair's endpoints as walls
+PERIMETER = {
+    'small': [
+        (wall_grid(20, 20, 0.3, 20), None),
+        (wall_grid(20, 20, 0.3, 20), 'A'),
+    ],
+    'medium': [
+        (wall_grid(60, 60, 0.3, 60), 'A'),
+        (wall_grid(60, 60, 0.45, 60), None),
+    ],
+    'large': [
+        (wall_grid(120, 120, 0.45, 120), None),
+        (wall_grid(120, 120, 0.45, 120), 'B'),
+    ],
+}
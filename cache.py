@@ -0,0 +1,97 @@
+import os
+
+# Solved puzzles are kept in a local sqlite file, keyed by a hash of the
+# canonical puzzle and the options that change the result. Values are JSON
+# in the canonical orientation; each solver maps them back to the caller's.
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# The dihedral group of a rectangle, identity first, as maps of (row, col)
+# inside a rows x cols box
+SYMMETRIES = [
+    lambda r, c, rows, cols: (r, c),                        # Identity
+    lambda r, c, rows, cols: (c, rows - 1 - r),             # Rotate 90
+    lambda r, c, rows, cols: (rows - 1 - r, cols - 1 - c),  # Rotate 180
+    lambda r, c, rows, cols: (cols - 1 - c, r),             # Rotate 270
+    lambda r, c, rows, cols: (rows - 1 - r, c),             # Mirror top to bottom
+    lambda r, c, rows, cols: (r, cols - 1 - c),             # Mirror left to right
+    lambda r, c, rows, cols: (c, r),                        # Transpose
+    lambda r, c, rows, cols: (cols - 1 - c, rows - 1 - r),  # Anti-transpose
+]
+
+def default_cache_path():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'puzzle-solvers', 'solutions.sqlite')
+
+def puzzle_key(kind, canonical, options):
+    # kind names the solver, canonical is the canonical puzzle text and
+    # options holds everything else that changes the stored result
+    import hashlib
+    import json
+
+    text = json.dumps([kind, canonical, options], sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class SolutionCache:
+    # Least recently used entries are evicted once the stored values take up
+    # more than max_bytes
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        import sqlite3
+
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used)")
+        self.connection.commit()
+
+    def get(self, key):
+        import json
+        import time
+
+        row = self.connection.execute("SELECT value FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.connection.execute("UPDATE solutions SET used = ? WHERE key = ?", (time.time(), key))
+        self.connection.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        import json
+        import time
+
+        text = json.dumps(value, separators=(',', ':'))
+        if len(text) > self.max_bytes:
+            return
+        self.connection.execute("INSERT OR REPLACE INTO solutions (key, value, size, used) VALUES (?, ?, ?, ?)", (key, text, len(text), time.time()))
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM solutions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.connection.execute("SELECT key, size FROM solutions ORDER BY used").fetchall():
+            self.connection.execute("DELETE FROM solutions WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        self.connection.close()
+
+def open_cache(path=None, enabled=True):
+    # CLI helper: the cache is optional, so a path that cannot be opened only
+    # turns it off
+    if not enabled:
+        return None
+    import sqlite3
+
+    try:
+        return SolutionCache(path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Solution cache disabled: {e}")
+        return None
@@ -1,4 +1,7 @@
 import argparse
+from collections import deque
+
+from render import RESET_COLOR, color_map, write_board
 
 def is_perimeter(grid, x, y, pairs, label=None):
     rows, cols = len(grid), len(grid[0])
@@ -113,30 +116,72 @@ def parse_grid(grid_str):
     start_end_pairs = [{'start': positions[0], 'end': positions[1], 'label': label} for label, positions in pairs_dict.items()]
     return grid, start_end_pairs, labels
 
-def colorize(cell, pairs, labels):
-    colors = [
-        "\033[97m",  # White
-        "\033[90m",  # Bright Black (Gray)
-        "\033[41m",  # Red Background
-        "\033[42m",  # Green Background
-        "\033[43m",  # Yellow Background
-        "\033[44m",  # Blue Background
-        "\033[45m",  # Magenta Background
-        "\033[46m",  # Cyan Background
-        "\033[47m",  # White Background
-        "\033[91m",  # Red
-        "\033[92m",  # Green
-        "\033[93m",  # Yellow
-        "\033[94m",  # Blue
-        "\033[95m",  # Magenta
-        "\033[96m",  # Cyan
-    ]
-    reset = '\033[0m'
-    color_map = {labels[i]: colors[i % len(colors)] for i in range(len(labels))}
+# Neighbours through which walls connect, and those a traversable cell can
+# touch a wall through
+ADJACENT_4 = ((-1, 0), (1, 0), (0, -1), (0, 1))
+ADJACENT_8 = ADJACENT_4 + ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+def grow_region(grid, region, sources, walls=frozenset()):
+    # Add to region every wall 4-connected to sources, cells in walls
+    # counting as walls too, with one breadth-first search from all of them
+    rows, cols = len(grid), len(grid[0])
+    queue = deque(cell for cell in set(sources) if cell not in region)
+    region.update(queue)
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy in ADJACENT_4:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < rows and 0 <= ny < cols and (nx, ny) not in region and (grid[nx][ny] == 0 or (nx, ny) in walls):
+                region.add((nx, ny))
+                queue.append((nx, ny))
+    return region
+
+def border_region(grid):
+    # The walls connected to the edge of the grid
+    rows, cols = len(grid), len(grid[0])
+    edge = [(x, y) for x in range(rows) for y in range(cols) if (x in (0, rows - 1) or y in (0, cols - 1)) and grid[x][y] == 0]
+    return grow_region(grid, set(), edge)
+
+def perimeter_map(grid, pairs, label=None, region=None):
+    # Copy of grid with every traversable perimeter cell marked '@': cells
+    # on the edge or next to, diagonals included, a wall connected to the
+    # edge. With a label, that pair's endpoints count as walls, as for
+    # check_perim -p. region is the border_region of grid, when the caller
+    # already has it.
+    rows, cols = len(grid), len(grid[0])
+    marked = [row[:] for row in grid]
+    if region is None:
+        region = border_region(grid)
+    if label:
+        pair = next((pair for pair in pairs if pair['label'] == label), None)
+        if pair is None:
+            print(f"Label '{label}' not found in pairs.")
+            return marked
+        # The endpoints only join the walls already known to reach the
+        # edge, so the search carries on from there
+        endpoints = {pair['start'], pair['end']}
+        sources = [(x, y) for x, y in endpoints
+                   if x in (0, rows - 1) or y in (0, cols - 1) or any((x + dx, y + dy) in region for dx, dy in ADJACENT_4)]
+        region = grow_region(grid, set(region), sources, endpoints)
+    for x in range(rows):
+        for y in range(cols):
+            if grid[x][y] == 1 and (x in (0, rows - 1) or y in (0, cols - 1) or any((x + dx, y + dy) in region for dx, dy in ADJACENT_8)):
+                marked[x][y] = '@'
+    return marked
+
+def perimeter_maps(grid, pairs, labels):
+    # perimeter_map for each of labels, all starting from one border_region
+    region = border_region(grid)
+    return {label: perimeter_map(grid, pairs, label, region) for label in labels}
+
+def colorize(cell, pairs, labels, colors=None):
+    # colors is color_map(labels), when the caller already has it
+    if colors is None:
+        colors = color_map(labels)
     if isinstance(cell, tuple):
         direction, label = cell
-        if label in color_map:
-            return f"{color_map[label]}{direction}{reset}"
+        if label in colors:
+            return f"{colors[label]}{direction}{RESET_COLOR}"
     else:
         if cell == 1 or cell == '1':
             return '_'
@@ -145,10 +190,10 @@ def colorize(cell, pairs, labels):
         elif cell == -1 or cell == '-1':
             return '*'
         elif cell == '@':
-            return f"\033[93m@{reset}"  # Yellow for perimeter cells
-    return f"{color_map.get(cell, '')}{cell}{reset}"
+            return f"\033[93m@{RESET_COLOR}"  # Yellow for perimeter cells
+    return f"{colors.get(cell, '')}{cell}{RESET_COLOR}"
 
-def print_grid(grid, pairs, use_color, labels):
+def print_grid(grid, pairs, use_color, labels, compact=False):
     grid_copy = [row[:] for row in grid]
     for pair in pairs:
         label = pair['label']
@@ -156,32 +201,35 @@ def print_grid(grid, pairs, use_color, labels):
         ex, ey = pair['end']
         grid_copy[sx][sy] = label
         grid_copy[ex][ey] = label
-    for row in grid_copy:
-        if use_color:
-            print(' '.join(colorize(str(cell), None, labels) for cell in row))
-        else:
-            print(' '.join(str(cell) for cell in row))
-    print()
+    if use_color and not compact:
+        colors = color_map(labels)
+        write_board([[colorize(str(cell), None, labels, colors) for cell in row] for row in grid_copy])
+    else:
+        write_board([[str(cell) for cell in row] for row in grid_copy], compact)
 
 def main():
     parser = argparse.ArgumentParser(description="Grid Perimeter Finder")
     parser.add_argument('-g', '--grid', type=str, required=True, help="Grid definition string")
     parser.add_argument('-c', '--color', action='store_true', help="Enable colored output")
-    parser.add_argument('-p', '--path', type=str, help="Start and end labels separated by a comma (e.g., A,B)")
+    parser.add_argument('-p', '--path', type=str, help="Labels whose endpoints count as walls, separated by commas for one map each (e.g., A,B)")
+    parser.add_argument('-a', '--all', action='store_true', help="Print a map for every label")
+    parser.add_argument('--compact', action='store_true', help="Print each map on one line, cells separated by ',' and rows by '.', without color")
     args = parser.parse_args()
 
     grid, pairs, labels = parse_grid(args.grid)
 
-    for i in range(len(grid)):
-        for j in range(len(grid[0])):
-            if grid[i][j] == 1:  # Only consider traversable cells
-                for pair in pairs:
-                    start, end = pair['start'], pair['end']
-                    if is_perimeter(grid, i, j, pairs, args.path):
-                        grid[i][j] = '@'
+    if args.all:
+        path_labels = labels
+    else:
+        path_labels = args.path.split(',') if args.path else [None]
+    maps = perimeter_maps(grid, pairs, path_labels)
 
-    print("Grid with Perimeter cells marked:")
-    print_grid(grid, pairs, args.color, labels)
+    for label, marked in maps.items():
+        if len(maps) == 1:
+            print("Grid with Perimeter cells marked:")
+        else:
+            print(f"Grid with Perimeter cells marked for path {label}:")
+        print_grid(marked, pairs, args.color, labels, args.compact)
 
 if __name__ == "__main__":
     main()
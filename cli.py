@@ -0,0 +1,12 @@
+import argparse
+import sys
+
+class CustomArgumentParser(argparse.ArgumentParser):
+    def error(self, message):
+        # Check if any argument starts with a '-'
+        for arg in sys.argv[1:]:
+            if arg.startswith('-') and not arg.startswith('--'):
+                message += "\nIf an argument starts with a '-', please escape it with a '\\'."
+                break
+        self.print_usage(sys.stderr)
+        self.exit(2, f"Error parsing arguments: {message}\n")
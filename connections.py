@@ -1,255 +1,453 @@
-from grid import Grid, Path
-import argparse
-import itertools
-import sys
-
-def find_paths(grid_obj, start, end, visited, perimeter_mode=False, label=None):
+from cache import SYMMETRIES, puzzle_key, open_cache
+from grid import Grid, Path, FREE, WALL, MOVE_DELTAS
+from limits import SearchBudget
+from stats import SearchStats, Phase, report
+
+def path_distances(neighbours, open_cells, source, target=None):
+    # Fewest steps from source to every cell through open cells. target can
+    # be reached but not passed through; unreachable cells get len(cells).
+    unreachable = len(open_cells)
+    distance = [unreachable] * unreachable
+    distance[source] = 0
+    queue = [source]
+    for cell in queue:
+        for other, _ in neighbours[cell]:
+            if distance[other] == unreachable and (open_cells[other] or other == target):
+                distance[other] = distance[cell] + 1
+                if open_cells[other]:
+                    queue.append(other)
+    return distance
+
+def walk_half_paths(neighbours, open_cells, origin, steps, distance, slack, terminal=None, stats=None, budget=None):
+    # Generator of (cell, moves, mask) for every simple path of exactly
+    # steps steps from origin through open cells, with moves packed as in
+    # Path and a mask bit per covered cell. distance holds the fewest steps
+    # to the far endpoint, which must stay within the slack steps left to
+    # the other half. terminal may only be entered as the last cell.
+    seen = bytearray(len(open_cells))
+
+    def walk(cell, taken, moves, mask):
+        if budget is not None and budget.expired():
+            return
+        if stats is not None:
+            stats.node('half paths', taken)
+        if taken == steps:
+            yield cell, moves, mask
+            return
+        seen[cell] = 1
+        left = steps - taken - 1
+        for other, code in neighbours[cell]:
+            if seen[other]:
+                continue
+            if distance[other] > left + slack:
+                if stats is not None:
+                    stats.prune('distance')
+                continue
+            if open_cells[other] or (other == terminal and not left):
+                yield from walk(other, taken + 1, moves | (code << (2 * taken)), mask | (1 << other))
+        seen[cell] = 0
+
+    yield from walk(origin, 0, 0, 1 << origin)
+
+def disjoint_halves(ahead, behind, order, depth=0):
+    # Generator of (ahead moves, behind moves) for every pair of halves with
+    # disjoint cell masks. Both lists are split on the cell bits in order,
+    # skipping the pairs that share a cell, until the pairs left are few
+    # enough to check directly.
+    if len(ahead) * len(behind) <= 32 or depth == len(order):
+        for mask, moves in ahead:
+            for other_mask, other_moves in behind:
+                if not mask & other_mask:
+                    yield moves, other_moves
+        return
+    bit = order[depth]
+    ahead_clear = [half for half in ahead if not half[0] & bit]
+    behind_clear = [half for half in behind if not half[0] & bit]
+    if ahead_clear:
+        if behind_clear:
+            yield from disjoint_halves(ahead_clear, behind_clear, order, depth + 1)
+        if len(behind_clear) < len(behind):
+            yield from disjoint_halves(ahead_clear, [half for half in behind if half[0] & bit], order, depth + 1)
+    if behind_clear and len(ahead_clear) < len(ahead):
+        yield from disjoint_halves([half for half in ahead if half[0] & bit], behind_clear, order, depth + 1)
+
+def meet_in_the_middle(grid_obj, start, end, visited=0, label=None, stats=None, budget=None):
+    # Generator of Path objects from start to end, built from half paths
+    # grown from both endpoints. Paths are produced one length at a time,
+    # shortest first: a path of L steps is split after ceil(L / 2) steps,
+    # so each has exactly one split, and only halves that can still finish
+    # within L steps are grown. The halves are grouped by the cell where
+    # they meet and joined when their cell masks share only that cell, so
+    # memory holds the halves of one length at a time.
+    neighbours = grid_obj.neighbours
+    start_index, end_index = grid_obj.index(*start), grid_obj.index(*end)
+    open_cells = bytearray(state == FREE and not (visited >> index) & 1 for index, state in enumerate(grid_obj.cells))
+    open_cells[start_index] = open_cells[end_index] = 0
+    to_end = path_distances(neighbours, open_cells, end_index, start_index)
+    to_start = path_distances(neighbours, open_cells, start_index, end_index)
+    every_cell = bytearray([1]) * len(open_cells)
+
+    # Lengths share the parity of the shortest one, up to a path through
+    # every open cell
+    for length in range(to_end[start_index], sum(open_cells) + 2, 2):
+        if budget is not None and budget.check():
+            return
+        ahead, behind = length - length // 2, length // 2
+        # Halves from end are reversed so they read from the meeting cell
+        # towards end; codes 0/1 and 2/3 are opposite moves
+        behind_halves = {}
+        for cell, moves, mask in walk_half_paths(neighbours, open_cells, end_index, behind, to_start, ahead, stats=stats, budget=budget):
+            reverse = 0
+            for i in range(behind):
+                reverse |= (((moves >> (2 * i)) & 3) ^ 1) << (2 * (behind - 1 - i))
+            behind_halves.setdefault(cell, []).append((mask & ~(1 << cell), reverse))
+        if not behind_halves:
+            continue
+        ahead_halves = {}
+        for cell, moves, mask in walk_half_paths(neighbours, open_cells, start_index, ahead, to_end, behind, end_index, stats, budget):
+            if cell in behind_halves:
+                ahead_halves.setdefault(cell, []).append((mask & ~(1 << cell), moves))
+
+        for cell, halves in ahead_halves.items():
+            # Split on the cells nearest the meeting cell first, where the
+            # two halves clash most often
+            distance = path_distances(neighbours, every_cell, cell)
+            order = [1 << other for other in sorted(range(len(open_cells)), key=distance.__getitem__) if open_cells[other] and other != cell]
+            for moves, reverse in disjoint_halves(halves, behind_halves[cell], order):
+                yield Path.from_moves(label, start, end, moves | (reverse << (2 * ahead)), length)
+
+def find_paths(grid_obj, start, end, visited=0, perimeter_mode=False, label=None, max_paths=50000, print_progress=False, bidirectional=False, stats=None, budget=None):
+    # Generator of Path objects from start to end that avoid the visited
+    # cells, given as a bitmask over flat cell indices. Paths are produced
+    # lazily, so a consumer that stops early never pays for the rest of the
+    # search. With bidirectional set, paths come from meet_in_the_middle,
+    # shortest first; perimeter mode always uses the DFS, since whether a
+    # move stays on the perimeter depends on the path drawn before it.
+    # stats, a SearchStats, counts the nodes, dead ends and paths; budget, a
+    # limits.SearchBudget, ends the search early.
     perimeter_message=" "
     if perimeter_mode:
         perimeter_message = " perimeter "
 
-    def dfs(current, path, visited):
-        nonlocal path_counter
-
-        # Early return if path_counter exceeds max_paths
-        if path_counter >= max_paths and -1 != max_paths:
+    def dfs(current, path_moves, steps):
+        if budget is not None and budget.expired():
             return
-
-        if current == end:
-            # Append the 'E' dummy direction to indicate the end
-            path.append('E')
-            # Create a Path object with the given label
-            paths.append(Path(label=label, start=start, end=end, directions=path[:]))
-            path.pop()  # Remove 'E' after adding the path
-            path_counter += 1
-
-            # Print progress if enabled
-            if print_progress and path_counter % 512 == 0:
-                print(f"\rPair {label} ({start} -> {end}){perimeter_message}paths found: {path_counter}", end='', flush=True)
+        if stats is not None:
+            stats.node(search_name, steps)
+        if current == end_index:
+            # Moves are packed two bits per step, as stored by Path
+            yield Path.from_moves(label, start, end, path_moves, steps)
             return
 
-        x, y = current
-        visited.add(current)
-
-        # Define possible moves: up, down, left, right
-        moves = [(-1, 0, '^'), (1, 0, 'v'), (0, -1, '<'), (0, 1, '>')]
+        seen[current] = 1
+        if oracle is not None:
+            oracle.push(current)
+
+        # Possible moves: up, down, left, right, in MOVE_DELTAS order
+        moved = False
+        for neighbour, code in neighbours[current]:
+            if grid_obj.is_valid_move(neighbour, seen) and (oracle is None or oracle.is_perimeter(neighbour)):
+                moved = True
+                yield from dfs(neighbour, path_moves | (code << (2 * steps)), steps + 1)
+        if stats is not None and not moved:
+            stats.count('dead_ends')
+
+        seen[current] = 0
+        if oracle is not None:
+            oracle.pop()
+
+    search_name = 'perimeter paths' if perimeter_mode else 'paths'
+    if bidirectional and not perimeter_mode:
+        paths = meet_in_the_middle(grid_obj, start, end, visited, label, stats, budget)
+    else:
+        neighbours = grid_obj.neighbours
+        end_index = grid_obj.index(*end)
+        seen = bytearray(grid_obj.rows * grid_obj.cols)
+        while visited:
+            low = visited & -visited
+            seen[low.bit_length() - 1] = 1
+            visited ^= low
+
+        # In perimeter mode every move must stay on the perimeter, which the
+        # oracle tracks incrementally as the path grows and backtracks
+        oracle = grid_obj.perimeter_oracle(grid_obj.pairs_dict.get(label, None)) if perimeter_mode else None
+        paths = dfs(grid_obj.index(*start), 0, 0)
 
-        for dx, dy, direction in moves:
-            nx, ny = x + dx, y + dy
-            if grid_obj.is_valid_move(nx, ny, visited) and (not perimeter_mode or grid_obj.is_perimeter(nx, ny, visited, grid.pairs_dict.get(label, None))):
-                path.append(direction)
-                dfs((nx, ny), path, visited)
-                path.pop()
+    path_counter = 0
+    for path in paths:
+        path_counter += 1
+        yield path
 
-        visited.remove(current)
+        # Print progress if enabled
+        if print_progress and path_counter % 512 == 0:
+            print(f"\rPair {label} ({start} -> {end}){perimeter_message}paths found: {path_counter}", end='', flush=True)
 
-    paths = []
-    path_counter = 0
-    dfs(start, [], visited)
+        # Stop early once max_paths have been found
+        if path_counter >= max_paths and -1 != max_paths:
+            if stats is not None:
+                stats.prune('max paths')
+            break
+    paths.close()
+    if stats is not None:
+        stats.count(search_name, path_counter)
 
     # Final progress print to indicate if max_paths was exceeded
     if print_progress:
         if path_counter >= max_paths and -1 != max_paths:
             status = "max_paths exceeded"
+        elif budget is not None and budget.reason is not None:
+            status = f"stopped: {budget.reason}"
         else:
             status = "complete"
         print(f"\rPair {label} ({start} -> {end}){perimeter_message}paths found: {path_counter} ({status})", flush=True)
 
-    return paths
-
-def find_all_combinations(grid_obj, labels):
-    def search(current_label_index, current_paths, visited_cells):
+def combination_dead_end(grid_obj, remaining, taken):
+    # Pruning check run after each path placement in find_all_combinations.
+    # remaining holds (start, end, min_cells) for each unrouted pair, with
+    # flat endpoint indices and the fewest free cells a path between them
+    # can use; taken marks cells used by the placed paths. The branch is
+    # dead when a pair's endpoints no longer share a free component, when a
+    # free component touches no pair that could run through it, or when the
+    # free cells left cannot hold the shortest paths of the remaining pairs.
+    # Returns the name of the rule that fired, or None.
+    cells, neighbours = grid_obj.cells, grid_obj.neighbours
+    component = [-1] * len(cells)
+    component_count = 0
+    free_cells = 0
+    for index, state in enumerate(cells):
+        if state != FREE or taken[index] or component[index] >= 0:
+            continue
+        component[index] = component_count
+        stack = [index]
+        while stack:
+            current = stack.pop()
+            free_cells += 1
+            for neighbour, _ in neighbours[current]:
+                if cells[neighbour] == FREE and not taken[neighbour] and component[neighbour] < 0:
+                    component[neighbour] = component_count
+                    stack.append(neighbour)
+        component_count += 1
+
+    if sum(min_cells for _, _, min_cells in remaining) > free_cells:
+        return 'free cells'
+
+    filled = [False] * component_count
+    for start, end, _ in remaining:
+        start_components = {component[neighbour] for neighbour, _ in neighbours[start]}
+        shared = start_components.intersection(component[neighbour] for neighbour, _ in neighbours[end])
+        shared.discard(-1)
+        if not shared and all(neighbour != end for neighbour, _ in neighbours[start]):
+            return 'cut off pair'
+        for number in shared:
+            filled[number] = True
+    if not all(filled):
+        return 'empty region'
+    return None
+
+def find_all_combinations(grid_obj, labels, max_paths=50000, bidirectional=False, stats=None, budget=None, routed=()):
+    # Generator of path lists, one path per label, that cover every
+    # traversable cell. Only the paths on the current search branch are kept
+    # alive, so memory grows with the number of labels rather than paths.
+    # After each placement the branch is checked with combination_dead_end,
+    # so cut-off pairs and unfillable regions end the branch straight away.
+    # routed holds paths already fixed by the caller; with a budget they are
+    # part of the partial state it keeps.
+    endpoints = []
+    for label in labels:
+        (sx, sy), (ex, ey) = grid_obj.pairs_dict[label]['start'], grid_obj.pairs_dict[label]['end']
+        endpoints.append((grid_obj.index(sx, sy), grid_obj.index(ex, ey), abs(sx - ex) + abs(sy - ey) - 1))
+    taken = bytearray(grid_obj.rows * grid_obj.cols)
+
+    def search(current_label_index, current_paths, visited_count, visited_mask):
+        if budget is not None:
+            if budget.expired():
+                return
+            budget.reach(len(routed) + current_label_index, current_paths, routed)
         if current_label_index == len(labels):
             # Check if all traversable cells are used
-            if len(visited_cells) == grid_obj.total_traversable:
-                valid_combinations.append(current_paths[:])
+            if visited_count == grid_obj.total_traversable:
+                yield current_paths[:]
+            elif stats is not None:
+                stats.prune('unused cells')
             return
 
         label = labels[current_label_index]
         pair = grid_obj.pairs_dict[label]
         start, end = pair['start'], pair['end']
+        remaining = endpoints[current_label_index + 1:]
 
-        # Find all paths for the current label
+        # Walk the paths for the current label as they are found. The pair
+        # stays active until the walk is done; deeper labels activate and
+        # restore their own pairs on top of it.
         grid_obj.activate_pair(pair, 1)
-        paths = find_paths(grid_obj, start, end, visited_cells, label=label)
-        grid_obj.activate_pair(None)
+        try:
+            for path in find_paths(grid_obj, start, end, visited_mask, label=label, max_paths=max_paths, bidirectional=bidirectional, stats=stats, budget=budget):
+                if stats is not None:
+                    stats.node('combinations', current_label_index)
+                # Check if path overlaps with already visited cells
+                path_mask = path.cell_mask(grid_obj.cols)
+                if path_mask & visited_mask:
+                    if stats is not None:
+                        stats.prune('overlap')
+                    continue
+
+                path_cells = [grid_obj.index(x, y) for x, y in path.coordinates()]
+                for index in path_cells:
+                    taken[index] = 1
+
+                rule = combination_dead_end(grid_obj, remaining, taken) if remaining else None
+                if rule is not None and stats is not None:
+                    stats.prune(rule)
+                if rule is None:
+                    # Add path to current paths
+                    current_paths.append(path)
+
+                    # Recurse to the next label with the path's cells visited
+                    yield from search(current_label_index + 1, current_paths, visited_count + len(path_cells), visited_mask | path_mask)
+
+                    # Backtrack: remove path
+                    current_paths.pop()
+
+                for index in path_cells:
+                    taken[index] = 0
+        finally:
+            grid_obj.activate_pair(None)
+
+    yield from search(0, [], 0, 0)
+
+def find_perimeter_paths(grid, max_paths=50000, verbosity=0, print_progress=False, stats=None, budget=None):
+    # Returns (all_perimeter_paths, perimeter_path_labels, internal_path_labels)
+    # where all_perimeter_paths holds one list of unique paths per perimeter label
+    all_perimeter_paths = []
+    perimeter_path_labels = []
+    internal_path_labels = []
+
+    for label, pair in grid.pairs_dict.items():
+        if verbosity >= 3:
+            print(f"Label {label} Grid Perimeter Cell View:")
+            grid.print_perimeter(label)
 
-        for path in paths:
-            # Get path coordinates
-            path_coords = path.get_path_coordinates(include_direction=False)
+        grid.activate_pair(pair, 1)
 
-            # Check if path overlaps with already visited cells
-            if any((x, y) in visited_cells for x, y in path_coords):
-                continue
+        # Find paths from start to end
+        paths_start_to_end = list(find_paths(grid, pair['start'], pair['end'], 0, perimeter_mode=True, label=label, max_paths=max_paths, print_progress=print_progress, stats=stats, budget=budget))
 
-            # Mark cells as visited
-            for x, y in path_coords:
-                visited_cells.add((x, y))
+        # Find paths from end to start
+        paths_end_to_start = list(find_paths(grid, pair['end'], pair['start'], 0, perimeter_mode=True, label=label, max_paths=max_paths, print_progress=print_progress, stats=stats, budget=budget))
 
-            # Add path to current paths
-            current_paths.append(path)
+        grid.activate_pair(None)
 
-            # Recurse to the next label
-            search(current_label_index + 1, current_paths, visited_cells)
+        # Extract cell masks for paths_start_to_end
+        cols = grid.cols
+        masks_start_to_end = {path.cell_mask(cols) for path in paths_start_to_end}
+
+        # Initialize unique paths with all paths from start to end
+        unique_paths = list(paths_start_to_end)
+
+        # Add paths from end to start only if they are not in paths_start_to_end
+        for path in paths_end_to_start:
+            if path.cell_mask(cols) not in masks_start_to_end:
+                unique_paths.append(path)
+
+        if unique_paths:
+            if print_progress:
+                print(f"Label {label} perimeter paths found:")
+                print(f"  Forward: {len(paths_start_to_end)}, Backward: {len(paths_end_to_start)}, Unique: {len(unique_paths)}\n")
+            perimeter_path_labels.append(label)
+            # Sort unique paths by their number of moves
+            unique_paths.sort(key=lambda path: path.steps)
+            all_perimeter_paths.append(unique_paths)
+        else:
+            internal_path_labels.append(label)
+
+    # Sort all_paths by the length of each sublist
+    all_perimeter_paths.sort(key=len)
+    return all_perimeter_paths, perimeter_path_labels, internal_path_labels
+
+def perimeter_compatibility(all_perimeter_paths, cols):
+    # compatible[i][a][j] is a bitset over the paths of label j that do not
+    # overlap path a of label i, filled in for every later label j > i
+    masks = [[path.cell_mask(cols) for path in paths] for paths in all_perimeter_paths]
+    compatible = []
+    for i, label_masks in enumerate(masks):
+        label_rows = []
+        for mask in label_masks:
+            row = [0] * len(masks)
+            for j in range(i + 1, len(masks)):
+                bits = 0
+                for b, other in enumerate(masks[j]):
+                    if not mask & other:
+                        bits |= 1 << b
+                row[j] = bits
+            label_rows.append(row)
+        compatible.append(label_rows)
+    return compatible
+
+def find_perimeter_combinations(all_perimeter_paths, cols, stats=None):
+    # Generator of non-overlapping combinations with one perimeter path per
+    # label, in itertools.product order. Labels are extended one at a time
+    # and the candidates for every later label are narrowed with the
+    # compatibility bitsets, so a conflict rules out all combinations below
+    # it at once. cols is the grid width used for the path cell masks. When
+    # given, stats receives the 'total' size of the cross product and running
+    # counts of 'valid' and 'pruned' combinations.
+    if stats is None:
+        stats = {}
+    sizes = [len(paths) for paths in all_perimeter_paths]
+    # Number of cross product entries below a choice at each depth
+    below = [1] * (len(sizes) + 1)
+    for depth in reversed(range(len(sizes))):
+        below[depth] = below[depth + 1] * sizes[depth]
+    stats.update(total=below[0], valid=0, pruned=0)
+    compatible = perimeter_compatibility(all_perimeter_paths, cols)
+
+    def search(depth, chosen, candidates):
+        if depth == len(sizes):
+            stats['valid'] += 1
+            yield tuple(all_perimeter_paths[i][a] for i, a in enumerate(chosen))
+            return
 
-            # Backtrack: remove path and unmark cells
-            current_paths.pop()
-            for x, y in set(path_coords):
-                visited_cells.remove((x, y))
+        options = candidates[depth]
+        stats['pruned'] += (sizes[depth] - bin(options).count('1')) * below[depth + 1]
+        while options:
+            low = options & -options
+            options ^= low
+            a = low.bit_length() - 1
+            row = compatible[depth][a]
+            narrowed = candidates[:depth + 1] + [candidates[j] & row[j] for j in range(depth + 1, len(sizes))]
+            # Forward check: some later label has no path left
+            if not all(narrowed[depth + 1:]):
+                stats['pruned'] += below[depth + 1]
+                continue
+            chosen.append(a)
+            yield from search(depth + 1, chosen, narrowed)
+            chosen.pop()
 
-    valid_combinations = []
-    search(0, [], set())
-    return valid_combinations
+    yield from search(0, [], [(1 << size) - 1 for size in sizes])
 
-class CustomArgumentParser(argparse.ArgumentParser):
-    def error(self, message):
-        # Check if any argument starts with a '-'
-        for arg in sys.argv[1:]:
-            if arg.startswith('-') and not arg.startswith('--'):
-                message += "\nIf an argument starts with a '-', please escape it with a '\\'."
-                break
-        self.print_usage(sys.stderr)
-        self.exit(2, f"Error parsing arguments: {message}\n")
-
-# Read in command line options
-parser = CustomArgumentParser(description='Grid Path Finder')
-parser.add_argument('-c', '--color', action='store_true', help="Enable colored output")
-parser.add_argument('-g', '--grid', type=str, required=True, help="Grid definition string")
-parser.add_argument('-m', '--max', type=int, default=50000, help="Maximum number of paths to find before stopping early (default: 50000, -1 for infinite)")
-parser.add_argument('-v', '--verbose', action='count', default=0, help="Increase verbosity level")
-args = parser.parse_args()
-
-# Set globals
-global max_paths, print_progress, verbosity, path_counter
-print_progress = False
-max_paths = args.max
-verbosity = args.verbose
-
-grid = Grid(args.grid)
-
-if verbosity >= 1:
-    print("Original Grid with Pairs Labeled:")
-    grid.print(use_color=True)
-
-if verbosity >= 2 and args.perimeter:
-    print("Grid Perimeter Cell View:")
-    grid.print_perimeter(args.perimeter)
-    print(f"grid.total_traversable: {grid.total_traversable}")
-
-# Store paths from each run
-all_perimeter_paths = []
-perimeter_path_labels = []
-internal_path_labels = []
-
-print("Searching for pairs that can be connected via grid perimeter:")
-for label, pair in grid.pairs_dict.items():
-    if verbosity >= 3:
-        print(f"Label {label} Grid Perimeter Cell View:")
-        grid.print_perimeter(label)
-
-    print_progress = True
-    grid.activate_pair(pair, 1)
-
-    # Find paths from start to end
-    path_counter = 0
-    paths_start_to_end = find_paths(grid, pair['start'], pair['end'], set(), perimeter_mode=True, label=label)
-
-    # Find paths from end to start
-    path_counter = 0
-    paths_end_to_start = find_paths(grid, pair['end'], pair['start'], set(), perimeter_mode=True, label=label)
-
-    grid.activate_pair(None)
-    print_progress = False
-
-    # Extract coordinate sets for paths_start_to_end
-    coordinates_start_to_end = {frozenset(path.get_path_coordinates(include_direction=False)) for path in paths_start_to_end}
-
-    # Initialize unique paths with all paths from start to end
-    unique_paths = list(paths_start_to_end)
-
-    # Add paths from end to start only if they are not in paths_start_to_end
-    for path in paths_end_to_start:
-        path_coords = frozenset(path.get_path_coordinates(include_direction=False))
-        if path_coords not in coordinates_start_to_end:
-            unique_paths.append(path)
-
-    if unique_paths:
-        print(f"Label {label} perimeter paths found:")
-        print(f"  Forward: {len(paths_start_to_end)}, Backward: {len(paths_end_to_start)}, Unique: {len(unique_paths)}\n")
-        perimeter_path_labels.append(label)
-        # Sort unique paths by the length of directions
-        unique_paths.sort(key=lambda path: len(path.directions))
-        all_perimeter_paths.append(unique_paths)
-    else:
-        internal_path_labels.append(label)
-
-# Sort all_paths by the length of each sublist
-all_perimeter_paths.sort(key=len)
-
-# Generate all combinations of perimeter paths
-all_perimeter_combinations = list(itertools.product(*all_perimeter_paths))
-
-# Filter combinations to remove those with overlapping coordinates
-valid_combinations = []
-for combination in all_perimeter_combinations:
-    all_coordinates = set()
-    overlap_found = False
-    for path in combination:
-        # Check for overlap
-        if all_coordinates.intersection(path.get_path_coordinates(include_direction=False)):
-            overlap_found = True
-            break
-        # Add path coordinates to the set
-        all_coordinates.update(path.get_path_coordinates(include_direction=False))
-
-    if not overlap_found:
-        valid_combinations.append(combination)
-
-# Check if any combinations were removed
-if len(valid_combinations) < len(all_perimeter_combinations):
-    print(f"Down-selected to {len(valid_combinations)} non-overlapping perimeter path combinations from {len(all_perimeter_combinations)} total combinations.")
-
-# Output the lists of labels
-if verbosity >= 2:
-    print("Labels that can be connected along the perimeter:", perimeter_path_labels)
-    print("Number of perimeter paths found per label       :")
-    for label in perimeter_path_labels:
-        # Find the corresponding paths list for the label
-        for paths in all_perimeter_paths:
-            if paths and paths[0].label == label:
-                print(f"\t{label}: {len(paths)}")
-    print("Labels that can only be connected internally    :", internal_path_labels)
-
-# Define labels_to_solve as only the labels that had no perimeter path(s)
-labels_to_solve = internal_path_labels
-
-# NOTE: Assumes at least 1 perimeter path was found
-# Process each combination of perimeter paths
-for i, path_combination in enumerate(valid_combinations):
-    print(f"\nProcessing perimeter path combination {i+1}/{len(valid_combinations)}:")
+def solve_combination(grid, path_combination, labels_to_solve, max_paths=50000, print_progress=False, bidirectional=False, stats=None, budget=None):
+    # Route the internal labels around one combination of perimeter paths and
+    # yield each full solution as a list of paths as soon as it is found
     for path in path_combination:
-        # Pass list of internal_path_labels to change total number of traversible cells
-        grid.activate_path(path, 0, len(internal_path_labels)) # Mark path as non-traversible
-    grid.print_paths(path_combination, use_color=args.color, debug_level=verbosity)
+        # Pass list of labels_to_solve to change total number of traversible cells
+        grid.activate_path(path, 0, len(labels_to_solve)) # Mark path as non-traversible
+
     label_path_count = []
     for label in labels_to_solve:
+        if budget is not None and budget.check():
+            break
         pair = grid.pairs_dict[label]
         start, end = pair['start'], pair['end']
         current_pair_info = f"Pair {label} ({start} -> {end}):"
-        path_counter = 0
 
         # Activate the pair to make the start and end points traversable
         grid.activate_pair(pair, 1)
 
-        print_progress = True
-        print(current_pair_info, end=' ')
-        paths = find_paths(grid, start, end, set(), perimeter_mode=False, label=label)
-        print_progress = False
-
-        if paths is None:
-            label_path_count.append((max_paths, label))
-        else:
-            label_path_count.append((len(paths), label))
+        if print_progress:
+            print(current_pair_info, end=' ')
+        # Only the count is needed here, so the paths are not kept
+        path_count = sum(1 for _ in find_paths(grid, start, end, 0, perimeter_mode=False, label=label, max_paths=max_paths, print_progress=print_progress, bidirectional=bidirectional, stats=stats, budget=budget))
+        label_path_count.append((path_count, label))
 
         # Deactivate the pair to restore the original grid state
         grid.activate_pair(None)
@@ -259,14 +457,553 @@ for i, path_combination in enumerate(valid_combinations):
     sorted_labels = [label for _, label in label_path_count]
 
     # Find all paths using the sorted labels
-    #all_paths = find_all_paths(grid, sorted_labels, 0, set())
-    all_paths = find_all_combinations(grid, sorted_labels)
+    try:
+        for paths in find_all_combinations(grid, sorted_labels, max_paths, bidirectional, stats, budget, path_combination):
+            yield paths + list(path_combination)
+    finally:
+        for path in path_combination:
+            grid.activate_path(None)    # Restore path
+
+worker_state = {}
+
+def init_worker(grid, labels_to_solve, max_paths, bidirectional, cancel_event, collect_stats, limits=None):
+    # Each worker gets its own pickled copy of the grid, so activating a
+    # combination's paths never touches another worker's state. The worker's
+    # budget always watches cancel_event, so a cancelled search stops
+    # mid-combination; limits is SearchBudget.share() when the solve has a
+    # budget of its own.
+    worker_state.update(grid=grid, labels=labels_to_solve, max_paths=max_paths, bidirectional=bidirectional, collect_stats=collect_stats)
+    timeout, node_budget, shared = limits or (None, None, None)
+    worker_state['budget'] = SearchBudget(timeout, node_budget, cancel=cancel_event, shared=shared)
+
+def solve_combination_chunk(path_combinations, limit):
+    # Runs in a worker process; returns (results, stats, stopped) with the
+    # solutions of each combination in the chunk, up to limit per
+    # combination, the chunk's statistics as a dict when they are collected
+    # and the worker budget's stopped(). Combinations not yet started when
+    # the search is cancelled are left empty.
+    stats = SearchStats() if worker_state['collect_stats'] else None
+    budget = worker_state['budget']
+    results = []
+    for path_combination in path_combinations:
+        solutions = []
+        if not budget.check():
+            stream = solve_combination(worker_state['grid'], path_combination, worker_state['labels'], worker_state['max_paths'], bidirectional=worker_state['bidirectional'], stats=stats, budget=budget)
+            for paths in stream:
+                solutions.append(paths)
+                if limit is not None and len(solutions) >= limit:
+                    break
+            stream.close()
+        results.append(solutions)
+    return results, stats.to_dict() if stats is not None else None, budget.stopped()
+
+def solve_combinations_parallel(grid, path_combinations, labels_to_solve, max_paths=50000, bidirectional=False, jobs=None, chunk_size=1, limit=None, stats=None, budget=None):
+    # Yield (path_combination, solutions) for every combination, in the order
+    # path_combinations produces them, with the combinations solved by a
+    # process pool in chunks of chunk_size. Only a few chunks per worker are
+    # queued at a time, so the combinations are still drawn lazily. Closing
+    # the generator early cancels every chunk that is still queued, and the
+    # running ones stop before their next combination. The workers'
+    # statistics are merged into stats as their chunks come back. Each
+    # worker gets a budget with the time left on budget, counting its nodes
+    # against budget's node budget together with the other workers, and the
+    # search stops once any of them runs out.
+    import itertools
+    import multiprocessing
+    import os
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context()
+    cancel_event = context.Event()
+    window = 2 * (jobs or os.cpu_count() or 1)
+    chunks = iter(lambda: list(itertools.islice(path_combinations, chunk_size)), [])
+    limits = budget.share(context) if budget is not None else None
+
+    def finished(chunk, future):
+        results, chunk_stats, stopped = future.result()
+        if chunk_stats is not None:
+            stats.merge(chunk_stats)
+        if budget is not None:
+            budget.merge(stopped)
+        return zip(chunk, results)
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=init_worker, initargs=(grid, labels_to_solve, max_paths, bidirectional, cancel_event, stats is not None, limits)) as executor:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(solve_combination_chunk, chunk, limit)))
+                if len(pending) >= window:
+                    yield from finished(*pending.popleft())
+                    if budget is not None and budget.check():
+                        return
+            while pending:
+                yield from finished(*pending.popleft())
+                if budget is not None and budget.check():
+                    return
+        finally:
+            cancel_event.set()
+            for chunk, future in pending:
+                future.cancel()
+
+def split_internal_routing(grid, parts, max_paths=50000, bidirectional=False, stats=None, budget=None):
+    # Split routing every pair internally into independent parts for a
+    # process pool. The labels are taken in order of fewest paths, as in
+    # solve_combination, and the paths of the first few are combined until
+    # there are at least parts prefixes, dropping those that leave a
+    # remaining pair cut off. Returns (prefixes, rest), each prefix a tuple
+    # of non-overlapping paths and rest the labels every prefix still routes.
+    label_path_count = []
+    for label, pair in grid.pairs_dict.items():
+        grid.activate_pair(pair, 1)
+        path_count = sum(1 for _ in find_paths(grid, pair['start'], pair['end'], 0, label=label, max_paths=max_paths, bidirectional=bidirectional, stats=stats, budget=budget))
+        label_path_count.append((path_count, label))
+        grid.activate_pair(None)
+    label_path_count.sort()
+    labels = [label for _, label in label_path_count]
+
+    endpoints = []
+    for label in labels:
+        (sx, sy), (ex, ey) = grid.pairs_dict[label]['start'], grid.pairs_dict[label]['end']
+        endpoints.append((grid.index(sx, sy), grid.index(ex, ey), abs(sx - ex) + abs(sy - ey) - 1))
 
-    if all_paths:
-        print("Solution found:")
-        for paths in all_paths:
-            grid.print_paths(paths + list(path_combination), use_color=args.color, debug_level=verbosity)
+    prefixes = [((), 0)]
+    depth = 0
+    while len(prefixes) < parts and depth < len(labels) - 1:
+        if budget is not None and budget.check():
+            break
+        pair = grid.pairs_dict[labels[depth]]
+        deeper = []
+        grid.activate_pair(pair, 1)
+        try:
+            for paths, mask in prefixes:
+                for path in find_paths(grid, pair['start'], pair['end'], mask, label=pair['label'], max_paths=max_paths, bidirectional=bidirectional, stats=stats, budget=budget):
+                    path_mask = mask | path.cell_mask(grid.cols)
+                    taken = bytearray(grid.rows * grid.cols)
+                    for index in range(len(taken)):
+                        taken[index] = (path_mask >> index) & 1
+                    if combination_dead_end(grid, endpoints[depth + 1:], taken) is None:
+                        deeper.append((paths + (path,), path_mask))
+        finally:
+            grid.activate_pair(None)
+        prefixes = deeper
+        depth += 1
+    return [paths for paths, _ in prefixes], labels[depth:]
+
+def iter_parallel_solutions(grid, path_combinations, labels_to_solve, max_paths=50000, bidirectional=False, jobs=None, limit=None, stats=None, budget=None):
+    # The solutions of solve_combinations_parallel as one stream
+    results = solve_combinations_parallel(grid, path_combinations, labels_to_solve, max_paths, bidirectional, jobs, limit=limit, stats=stats, budget=budget)
+    try:
+        for path_combination, solutions in results:
+            yield from solutions
+    finally:
+        results.close()
+
+def iter_combination_solutions(grid, path_combinations, labels_to_solve, max_paths=50000, print_progress=False, bidirectional=False, jobs=1, limit=None, stats=None, budget=None):
+    # Chain the solutions of every perimeter path combination into one stream.
+    # Routing a label along the perimeter is only a guess, so if no
+    # combination leads to a solution every pair is routed internally. With
+    # jobs other than 1 the combinations are solved in worker processes, at
+    # most limit solutions each, and streamed back in the same order; the
+    # internal routing is then split with split_internal_routing so the
+    # workers share it as well.
+    found = False
+    if jobs == 1:
+        for path_combination in path_combinations:
+            if budget is not None and budget.check():
+                return
+            for paths in solve_combination(grid, path_combination, labels_to_solve, max_paths, print_progress, bidirectional, stats, budget):
+                found = True
+                yield paths
     else:
-        print("No solution found that uses all traversable locations.")
-    for path in path_combination:
-        grid.activate_path(None)    # Restore path
+        results = iter_parallel_solutions(grid, path_combinations, labels_to_solve, max_paths, bidirectional, jobs, limit, stats, budget)
+        try:
+            for paths in results:
+                found = True
+                yield paths
+        finally:
+            results.close()
+    if not found and len(labels_to_solve) < len(grid.pairs_dict) and not (budget is not None and budget.check()):
+        if jobs == 1:
+            yield from solve_combination(grid, (), list(grid.pairs_dict), max_paths, print_progress, bidirectional, stats, budget)
+        else:
+            import os
+
+            # A few parts per worker, so one slow part does not hold up the rest
+            prefixes, rest = split_internal_routing(grid, 4 * (jobs or os.cpu_count() or 1), max_paths, bidirectional, stats, budget)
+            yield from iter_parallel_solutions(grid, iter(prefixes), rest, max_paths, bidirectional, jobs, limit, stats, budget)
+
+def canonical_grid(grid):
+    # Returns (text, cell_map, label_map, orientation) for the smallest text
+    # over the eight rotations and reflections of the grid, with labels
+    # numbered in reading order. cell_map takes each flat cell index to its
+    # index in that orientation and label_map each label to its number, so
+    # input syntax, label names and orientation all drop out of the text;
+    # orientation is the index in SYMMETRIES of the transform used.
+    endpoints = {}
+    for label, pair in grid.pairs_dict.items():
+        endpoints[grid.index(*pair['start'])] = endpoints[grid.index(*pair['end'])] = label
+    best = None
+    for orientation, transform in enumerate(SYMMETRIES):
+        images = [transform(x, y, grid.rows, grid.cols) for x in range(grid.rows) for y in range(grid.cols)]
+        width = max(y for _, y in images) + 1
+        cell_map = [x * width + y for x, y in images]
+        order = sorted(range(len(cell_map)), key=cell_map.__getitem__)
+        label_map = {}
+        tokens = []
+        for index in order:
+            if index in endpoints:
+                tokens.append(str(label_map.setdefault(endpoints[index], len(label_map))))
+            else:
+                tokens.append('#' if grid.cells[index] == WALL else '.')
+        text = f"{len(order) // width}x{width}:{','.join(tokens)}"
+        if best is None or text < best[0]:
+            best = (text, cell_map, label_map, orientation)
+    return best
+
+def pack_solution(grid, paths, cell_map, label_map):
+    # A solution in canonical form: [label number, cell indices] per path
+    return [[label_map[path.label], [cell_map[grid.index(x, y)] for x, y in path.coordinates()]] for path in paths]
+
+def unpack_solution(grid, packed, cell_map, label_map):
+    # Rebuild the caller's Path objects from a canonical solution
+    cells = [0] * len(cell_map)
+    for index, image in enumerate(cell_map):
+        cells[image] = index
+    labels = {number: label for label, number in label_map.items()}
+    paths = []
+    for number, path_cells in packed:
+        pair = grid.pairs_dict[labels[number]]
+        coordinates = [divmod(cells[image], grid.cols) for image in path_cells]
+        # Reflections can leave the stored path running end to start
+        if coordinates[0] != pair['start']:
+            coordinates.reverse()
+        moves = 0
+        for step, ((x, y), (next_x, next_y)) in enumerate(zip(coordinates, coordinates[1:])):
+            moves |= MOVE_DELTAS.index((next_x - x, next_y - y)) << (2 * step)
+        paths.append(Path.from_moves(pair['label'], pair['start'], pair['end'], moves, len(coordinates) - 1))
+    return paths
+
+def cache_entry(packed, perimeter_labels, internal_labels, combination_stats, label_map):
+    # The stored result, with labels as their canonical numbers
+    return {
+        'perimeter_labels': [label_map[label] for label in perimeter_labels],
+        'internal_labels': [label_map[label] for label in internal_labels],
+        'perimeter_combinations': combination_stats.get('valid', 0),
+        'pruned_combinations': combination_stats.get('pruned', 0),
+        'solutions': packed,
+    }
+
+def numberlink_cache_key(grid, max_paths, engine, limit, bidirectional):
+    # Returns (key, cell_map, label_map); the options change which
+    # solutions a search finds, so they are part of the key. Both engines
+    # list their solutions in an order that follows the grid's orientation,
+    # and label names break ties in the order labels are routed, so those
+    # are part of the key too: a rotated or relabelled grid is solved again
+    # rather than given another grid's list.
+    text, cell_map, label_map, orientation = canonical_grid(grid)
+    labels = sorted(label_map, key=label_map.get)
+    options = {'max_paths': max_paths, 'engine': engine, 'limit': limit, 'bidirectional': bidirectional, 'orientation': orientation, 'labels': labels}
+    return puzzle_key('numberlink', text, options), cell_map, label_map
+
+def solve_numberlink(grid_str, max_paths=50000, engine='enumerate', limit=None, on_solution=None, bidirectional=False, jobs=1, cache=None, stats=None, budget=None):
+    """Solve a Numberlink grid string.
+
+    Returns a dict with the parsed Grid, the labels routed along the perimeter
+    and internally, how many perimeter path combinations were tried and
+    pruned, and the solutions found as lists of Path objects. The
+    'propagate' engine skips the perimeter split, and bidirectional
+    enumerates internal paths from both ends, shortest first. With jobs
+    other than 1 (None for one per CPU) the perimeter path combinations are
+    solved in that many worker processes. The search stops after limit
+    solutions (1 for the first solution only). When
+    on_solution is given, each solution is passed to it as soon as it is
+    found instead of being collected, and 'solutions' is left empty.
+    Passing a cache.SolutionCache reuses the result of any earlier solve of
+    the same grid, with 'cached' set in the result. Passing a stats.SearchStats collects search
+    counters and phase timings into it, returned as 'stats'. A
+    limits.SearchBudget bounds the solve by time, nodes or cancellation;
+    when it runs out, 'stopped' holds the reason and 'partial' the paths of
+    the most labels routed at once, and nothing is cached.
+    """
+    with Phase(stats, 'parse'):
+        grid = Grid(grid_str)
+    if cache is not None:
+        with Phase(stats, 'cache'):
+            key, cell_map, label_map = numberlink_cache_key(grid, max_paths, engine, limit, bidirectional)
+            stored = cache.get(key)
+        if stored is not None:
+            labels = {number: label for label, number in label_map.items()}
+            solutions = [unpack_solution(grid, packed, cell_map, label_map) for packed in stored['solutions']]
+            if on_solution is not None:
+                for paths in solutions:
+                    on_solution(paths)
+            return {
+                'grid': grid,
+                'perimeter_labels': [labels[number] for number in stored['perimeter_labels']],
+                'internal_labels': [labels[number] for number in stored['internal_labels']],
+                'perimeter_combinations': stored['perimeter_combinations'],
+                'pruned_combinations': stored['pruned_combinations'],
+                'solutions': solutions if on_solution is None else [],
+                'solution_count': len(solutions),
+                'cached': True,
+                'stats': stats,
+                'stopped': None,
+                'partial': None,
+            }
+
+    combination_stats = {'valid': 0, 'pruned': 0}
+    if engine == 'propagate':
+        from numberlink import solve_grid
+        perimeter_path_labels, internal_path_labels = [], list(grid.pairs_dict)
+        stream = solve_grid(grid, stats=stats, budget=budget)
+    else:
+        with Phase(stats, 'perimeter search'):
+            all_perimeter_paths, perimeter_path_labels, internal_path_labels = find_perimeter_paths(grid, max_paths, stats=stats, budget=budget)
+        combinations = find_perimeter_combinations(all_perimeter_paths, grid.cols, combination_stats)
+        stream = iter_combination_solutions(grid, combinations, internal_path_labels, max_paths, bidirectional=bidirectional, jobs=jobs, limit=limit, stats=stats, budget=budget)
+
+    solutions = []
+    packed = []
+    found = 0
+    try:
+        with Phase(stats, 'combination search'):
+            for paths in stream:
+                found += 1
+                if cache is not None:
+                    packed.append(pack_solution(grid, paths, cell_map, label_map))
+                if on_solution is None:
+                    solutions.append(paths)
+                else:
+                    on_solution(paths)
+                if limit is not None and found >= limit:
+                    break
+    finally:
+        stream.close()
+    if stats is not None:
+        stats.count('solutions', found)
+        stats.count('perimeter combinations', combination_stats['valid'])
+        if combination_stats['pruned']:
+            stats.prune('perimeter overlap', combination_stats['pruned'])
+
+    stopped = budget.reason if budget is not None else None
+    if cache is not None and stopped is None:
+        cache.put(key, cache_entry(packed, perimeter_path_labels, internal_path_labels, combination_stats, label_map))
+
+    return {
+        'grid': grid,
+        'perimeter_labels': perimeter_path_labels,
+        'internal_labels': internal_path_labels,
+        'perimeter_combinations': combination_stats['valid'],
+        'pruned_combinations': combination_stats['pruned'],
+        'solutions': solutions,
+        'solution_count': found,
+        'cached': False,
+        'stats': stats,
+        'stopped': stopped,
+        'partial': budget.partial if stopped is not None else None,
+    }
+
+def print_partial(grid, budget, found, use_color=False, verbosity=0, compact=False):
+    # Report a search stopped by its budget and, when it found no solution,
+    # the most labels it had routed at once
+    print(f"\nSearch stopped early ({budget.reason}) after {found} solution(s).")
+    if found:
+        return
+    if budget.partial:
+        print(f"Best partial state, {len(budget.partial)} of {len(grid.pairs_dict)} labels routed:")
+        grid.print_paths(budget.partial, use_color=use_color, debug_level=verbosity, compact=compact)
+    else:
+        print("No label was routed.")
+
+def main():
+    from cli import CustomArgumentParser
+
+    # Read in command line options
+    parser = CustomArgumentParser(description='Grid Path Finder')
+    parser.add_argument('-c', '--color', action='store_true', help="Enable colored output")
+    parser.add_argument('-g', '--grid', type=str, required=True, help="Grid definition string")
+    parser.add_argument('-m', '--max', type=int, default=50000, help="Maximum number of paths to find before stopping early (default: 50000, -1 for infinite)")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="Increase verbosity level")
+    parser.add_argument('-e', '--engine', choices=['enumerate', 'propagate'], default='enumerate', help="Search engine: enumerate paths per pair and combine them, or propagate cell constraints (default: enumerate)")
+    parser.add_argument('-l', '--limit', type=int, default=None, help="Stop after this many solutions (default: all)")
+    parser.add_argument('-f', '--first', action='store_true', help="Stop at the first solution (same as --limit 1)")
+    parser.add_argument('-b', '--bidirectional', action='store_true', help="Enumerate internal paths from both endpoints, shortest first")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Number of worker processes to solve perimeter path combinations, and the internal routing when none of them works, with (default: 1, 0 for one per CPU)")
+    parser.add_argument('--cache', type=str, nargs='?', const='', default=None, metavar='PATH', help="Reuse and store solutions in a cache file (default path: $XDG_CACHE_HOME/puzzle-solvers/solutions.sqlite, with ~/.cache when XDG_CACHE_HOME is not set)")
+    parser.add_argument('--stats', choices=['text', 'json'], default=None, help="Print search counters and phase timings at the end, as text or JSON")
+    parser.add_argument('--timeout', type=float, default=None, help="Stop searching after this many seconds and show the best partial state")
+    parser.add_argument('--node-budget', type=int, default=None, help="Stop searching after this many search nodes, counted over all worker processes with --jobs, and show the best partial state")
+    parser.add_argument('--compact', action='store_true', help="Print each solution on one line, cells separated by ',' and rows by '.', without color")
+    args = parser.parse_args()
+
+    max_paths = args.max
+    verbosity = args.verbose
+    limit = 1 if args.first else args.limit
+    jobs = args.jobs if args.jobs > 0 else None
+    stats = SearchStats() if args.stats else None
+    budget = SearchBudget(args.timeout, args.node_budget) if args.timeout is not None or args.node_budget is not None else None
+
+    with Phase(stats, 'parse'):
+        grid = Grid(args.grid)
+
+    if verbosity >= 1:
+        print("Original Grid with Pairs Labeled:")
+        grid.print(use_color=True)
+
+    if verbosity >= 2:
+        print(f"grid.total_traversable: {grid.total_traversable}")
+
+    # A puzzle solved before, in any orientation and with any labels, is
+    # printed straight from the cache
+    with Phase(stats, 'cache'):
+        cache = open_cache(args.cache or None, args.cache is not None)
+        if cache is not None:
+            key, cell_map, label_map = numberlink_cache_key(grid, max_paths, args.engine, limit, args.bidirectional)
+            stored = cache.get(key)
+    if cache is not None and stored is not None:
+        print(f"Solutions loaded from cache {cache.path}:")
+        with Phase(stats, 'render'):
+            for packed in stored['solutions']:
+                print("Solution found:")
+                grid.print_paths(unpack_solution(grid, packed, cell_map, label_map), use_color=args.color, debug_level=verbosity, compact=args.compact)
+        if not stored['solutions']:
+            print("No solution found that uses all traversable locations.")
+        cache.close()
+        report(stats, args.stats)
+        return
+    # Solutions printed below, kept for the cache
+    solved = []
+
+    if args.engine == 'propagate':
+        from numberlink import LinkSolver
+
+        solver = LinkSolver(grid, stats, budget)
+        found = 0
+        with Phase(stats, 'search'):
+            for paths in solver.search():
+                found += 1
+                solved.append(paths)
+                with Phase(stats, 'render'):
+                    print("Solution found:")
+                    grid.print_paths(paths, use_color=args.color, debug_level=verbosity, compact=args.compact)
+                if limit is not None and found >= limit:
+                    break
+        stopped = budget is not None and budget.reason is not None
+        if stopped:
+            print_partial(grid, budget, found, args.color, verbosity, args.compact)
+        elif not found:
+            print("No solution found that uses all traversable locations.")
+        if verbosity >= 1:
+            print(f"Search nodes: {solver.nodes}")
+        if cache is not None:
+            if not stopped:
+                packed = [pack_solution(grid, paths, cell_map, label_map) for paths in solved]
+                cache.put(key, cache_entry(packed, [], list(grid.pairs_dict), {}, label_map))
+            cache.close()
+        report(stats, args.stats)
+        return
+
+    print("Searching for pairs that can be connected via grid perimeter:")
+    with Phase(stats, 'perimeter search'):
+        all_perimeter_paths, perimeter_path_labels, internal_path_labels = find_perimeter_paths(grid, max_paths, verbosity, print_progress=True, stats=stats, budget=budget)
+    # Output the lists of labels
+    if verbosity >= 2:
+        print("Labels that can be connected along the perimeter:", perimeter_path_labels)
+        print("Number of perimeter paths found per label       :")
+        for label in perimeter_path_labels:
+            # Find the corresponding paths list for the label
+            for paths in all_perimeter_paths:
+                if paths and paths[0].label == label:
+                    print(f"\t{label}: {len(paths)}")
+        print("Labels that can only be connected internally    :", internal_path_labels)
+
+    # Define labels_to_solve as only the labels that had no perimeter path(s)
+    labels_to_solve = internal_path_labels
+
+    # Process each combination of perimeter paths as the search finds it,
+    # printing solutions as they are found. Worker processes solve the
+    # combinations ahead of the printing, without per-pair progress, and
+    # their results are printed in the same order.
+    combination_stats = {}
+    combinations = find_perimeter_combinations(all_perimeter_paths, grid.cols, combination_stats)
+    if jobs == 1:
+        results = ((path_combination, solve_combination(grid, path_combination, labels_to_solve, max_paths, print_progress=True, bidirectional=args.bidirectional, stats=stats, budget=budget)) for path_combination in combinations)
+    else:
+        results = solve_combinations_parallel(grid, combinations, labels_to_solve, max_paths, args.bidirectional, jobs, limit=limit, stats=stats, budget=budget)
+    found = 0
+    with Phase(stats, 'combination search'):
+        for i, (path_combination, solutions) in enumerate(results):
+            with Phase(stats, 'render'):
+                print(f"\nProcessing perimeter path combination {i+1}:")
+                for path in path_combination:
+                    grid.activate_path(path, 0, len(labels_to_solve))
+                grid.print_paths(path_combination, use_color=args.color, debug_level=verbosity, compact=args.compact)
+                for path in path_combination:
+                    grid.activate_path(None)
+
+            combination_found = 0
+            for paths in solutions:
+                with Phase(stats, 'render'):
+                    if not combination_found:
+                        print("Solution found:")
+                    grid.print_paths(paths, use_color=args.color, debug_level=verbosity, compact=args.compact)
+                combination_found += 1
+                found += 1
+                solved.append(paths)
+                if limit is not None and found >= limit:
+                    break
+            if jobs == 1:
+                solutions.close()
+
+            if budget is not None and budget.check():
+                break
+            if not combination_found:
+                print("No solution found that uses all traversable locations.")
+            if limit is not None and found >= limit:
+                break
+        results.close()
+        combinations.close()
+
+        # The perimeter split is only a guess, so fall back to routing every
+        # pair internally when it leads nowhere
+        if not found and perimeter_path_labels and not (budget is not None and budget.check()):
+            print("\nNo perimeter path combination led to a solution, routing all pairs internally:")
+            solutions = solve_combination(grid, (), list(grid.pairs_dict), max_paths, print_progress=True, bidirectional=args.bidirectional, stats=stats, budget=budget)
+            for paths in solutions:
+                with Phase(stats, 'render'):
+                    if not found:
+                        print("Solution found:")
+                    grid.print_paths(paths, use_color=args.color, debug_level=verbosity, compact=args.compact)
+                found += 1
+                solved.append(paths)
+                if limit is not None and found >= limit:
+                    break
+            solutions.close()
+            if not found and not (budget is not None and budget.reason is not None):
+                print("No solution found that uses all traversable locations.")
+
+    # Check if any combinations were removed
+    if combination_stats['pruned']:
+        print(f"Pruned {combination_stats['pruned']} overlapping perimeter path combinations from {combination_stats['total']} total combinations, leaving {combination_stats['valid']}.")
+
+    stopped = budget is not None and budget.reason is not None
+    if stopped:
+        print_partial(grid, budget, found, args.color, verbosity, args.compact)
+
+    # A stopped search may have missed solutions, so it is not cached
+    if cache is not None:
+        if not stopped:
+            packed = [pack_solution(grid, paths, cell_map, label_map) for paths in solved]
+            cache.put(key, cache_entry(packed, perimeter_path_labels, internal_path_labels, combination_stats, label_map))
+        cache.close()
+
+    if stats is not None:
+        stats.count('solutions', found)
+        stats.count('perimeter combinations', combination_stats['valid'])
+        if combination_stats['pruned']:
+            stats.prune('perimeter overlap', combination_stats['pruned'])
+    report(stats, args.stats)
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,82 @@
+from render import RESET_COLOR, color_map, write_board
+
 # Global debug variable
 DEBUG = False
 
+# Moves are packed two bits per step, in the order of MOVE_CODES
+MOVE_CODES = {'^': 0, 'v': 1, '<': 2, '>': 3}
+MOVE_CHARS = '^v<>'
+MOVE_DELTAS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
 class Path:
+    __slots__ = ('label', 'start', 'end', 'moves', 'steps', 'terminated', '_coords', '_mask', '_mask_cols')
+
     def __init__(self, label, start, end, directions=None):
         self.label = label
         self.start = start
         self.end = end
         self.directions = directions if directions is not None else []
-        
+
         # Call the print function if debug mode is enabled
         if DEBUG:
             self.print()
 
+    @classmethod
+    def from_moves(cls, label, start, end, moves, steps):
+        # Build a finished path straight from packed moves, skipping the
+        # directions list
+        path = cls.__new__(cls)
+        path.label, path.start, path.end = label, start, end
+        path.moves, path.steps, path.terminated = moves, steps, True
+        path._coords = path._mask = path._mask_cols = None
+        return path
+
+    @property
+    def directions(self):
+        # Unpacked view of the moves, with the 'E' sentinel on finished paths
+        directions = [MOVE_CHARS[(self.moves >> (2 * i)) & 3] for i in range(self.steps)]
+        if self.terminated:
+            directions.append('E')
+        return directions
+
+    @directions.setter
+    def directions(self, directions):
+        self.terminated = bool(directions) and directions[-1] == 'E'
+        self.steps = len(directions) - self.terminated
+        self.moves = 0
+        for i in range(self.steps):
+            self.moves |= MOVE_CODES[directions[i]] << (2 * i)
+        self._coords = self._mask = self._mask_cols = None
+
+    def coordinates(self):
+        # Cached tuple of the cells the path covers, in order
+        if self._coords is None:
+            x, y = self.start
+            coords = []
+            moves = self.moves
+            for _ in range(self.steps):
+                coords.append((x, y))
+                dx, dy = MOVE_DELTAS[moves & 3]
+                x, y = x + dx, y + dy
+                moves >>= 2
+            if self.terminated:
+                coords.append((x, y))
+            self._coords = tuple(coords)
+        return self._coords
+
+    def cell_mask(self, cols):
+        # Cached bitmask of covered cells, bit x * cols + y for cell (x, y)
+        if self._mask_cols != cols:
+            mask = 0
+            for x, y in self.coordinates():
+                mask |= 1 << (x * cols + y)
+            self._mask, self._mask_cols = mask, cols
+        return self._mask
+
     def get_path_coordinates(self, include_direction=True):
-        x, y = self.start
-        path_coordinates = []
-        for direction in self.directions:
-            if include_direction:
-                path_coordinates.append((x, y, direction))
-            else:
-                path_coordinates.append((x, y))
-            if direction == '^':
-                x -= 1
-            elif direction == 'v':
-                x += 1
-            elif direction == '<':
-                y -= 1
-            elif direction == '>':
-                y += 1
-        return path_coordinates   
+        if include_direction:
+            return [(x, y, direction) for (x, y), direction in zip(self.coordinates(), self.directions)]
+        return list(self.coordinates())
 
     def __repr__(self):
         return f"Path(label={self.label}, start={self.start}, end={self.end}, directions={self.directions})"
@@ -36,11 +84,119 @@ class Path:
     def print(self):
         print(f"Path Object: Label={self.label}, Start={self.start}, End={self.end}, Directions={self.directions}")
 
+# Cell states in Grid.cells, stored as the grid value plus one
+ENDPOINT = 0
+WALL = 1
+FREE = 2
+
+# Offsets of the 8 surrounding cells
+SURROUNDING = MOVE_DELTAS + [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+class PerimeterOracle:
+    # Answers perimeter queries for one pair while a path is being built.
+    # Walls (including the pair's own endpoints) and every path cell count
+    # as outside; the outside cells joined to the grid border are kept
+    # labelled, along with how many labelled walls touch each cell. Pushing
+    # a path cell floods from it and records what it labelled, and popping
+    # undoes exactly that, so a query is a lookup. Cells are flat Grid
+    # indices.
+    #
+    # The original per-query flood dropped one arbitrary cell (set.pop())
+    # from the path before flooding. Keeping the whole path accepts every
+    # move that check accepted, plus a few more.
+    def __init__(self, grid_obj, pair=None):
+        self.grid_obj = grid_obj
+        self.wall = bytearray(state == WALL for state in grid_obj.cells)
+        if pair is not None:
+            for x, y in (pair['start'], pair['end']):
+                self.wall[grid_obj.index(x, y)] = True
+        self.outside = bytearray(self.wall)
+        self.connected = bytearray(len(self.wall))
+        self.touching = [0] * len(self.wall)
+        self.history = []
+        self.flood([index for index, wall in enumerate(self.wall) if wall and grid_obj.border[index]])
+
+    def flood(self, sources):
+        # Label the outside cells reachable from sources; returns them
+        neighbours, surrounding = self.grid_obj.neighbours, self.grid_obj.surrounding
+        outside, connected = self.outside, self.connected
+        labelled = []
+        stack = [index for index in sources if not connected[index]]
+        for index in stack:
+            connected[index] = True
+        while stack:
+            index = stack.pop()
+            labelled.append(index)
+            if self.wall[index]:
+                for other in surrounding[index]:
+                    self.touching[other] += 1
+            for other, _ in neighbours[index]:
+                if outside[other] and not connected[other]:
+                    connected[other] = True
+                    stack.append(other)
+        return labelled
+
+    def push(self, index):
+        # index joins the path, and with it the outside
+        labelled = []
+        if not self.outside[index]:
+            self.outside[index] = True
+            if self.grid_obj.border[index] or any(self.connected[other] for other, _ in self.grid_obj.neighbours[index]):
+                labelled = self.flood([index])
+        self.history.append((index, labelled))
+
+    def pop(self):
+        index, labelled = self.history.pop()
+        surrounding = self.grid_obj.surrounding
+        for cell in labelled:
+            self.connected[cell] = False
+            if self.wall[cell]:
+                for other in surrounding[cell]:
+                    self.touching[other] -= 1
+        if not self.wall[index]:
+            self.outside[index] = False
+
+    def is_perimeter(self, index):
+        # On the border, or next to a wall that is joined to the border
+        return self.grid_obj.border[index] or self.touching[index] > 0
+
 class Grid:
     def __init__(self, grid_str):
-        self.grid, self.pairs_dict, self.labels = self.parse_grid(grid_str)
-        self.total_traversable = sum(cell == 1 for row in self.grid for cell in row) + len(self.pairs_dict) * 2
-        self.original_values = []  # Stack to store original values of pairs
+        grid, self.pairs_dict, self.labels = self.parse_grid(grid_str)
+        self.rows, self.cols = len(grid), len(grid[0])
+        # Flat cell states indexed by row * cols + col
+        self.cells = bytearray(value + 1 for row in grid for value in row)
+        self.neighbours, self.surrounding, self.border = self.neighbour_tables()
+        self.free_cells = self.cells.count(FREE)
+        self.total_traversable = self.free_cells + len(self.pairs_dict) * 2
+        # Drawing colors, and the label of each endpoint by its position
+        self.colors = color_map(self.labels)
+        self.endpoints = {position: label for label, pair in self.pairs_dict.items() for position in (pair['start'], pair['end'])}
+        # Undo log of (index, old state) entries, and the log length at the
+        # start of each activation still in effect
+        self.undo_log = []
+        self.undo_marks = []
+
+    @property
+    def grid(self):
+        # Row lists of the original values: 1 free, 0 wall, -1 endpoint
+        return [[state - 1 for state in self.cells[x * self.cols:(x + 1) * self.cols]] for x in range(self.rows)]
+
+    def index(self, x, y):
+        return x * self.cols + y
+
+    def neighbour_tables(self):
+        # neighbours[i] lists (index, move code) for the 4-way neighbours of
+        # cell i in MOVE_DELTAS order, surrounding[i] the 8-way neighbours'
+        # indices, and border[i] is set for cells on the grid edge
+        neighbours, surrounding = [], []
+        border = bytearray(self.rows * self.cols)
+        for x in range(self.rows):
+            for y in range(self.cols):
+                neighbours.append([(self.index(x + dx, y + dy), code) for code, (dx, dy) in enumerate(MOVE_DELTAS) if 0 <= x + dx < self.rows and 0 <= y + dy < self.cols])
+                surrounding.append([self.index(x + dx, y + dy) for dx, dy in SURROUNDING if 0 <= x + dx < self.rows and 0 <= y + dy < self.cols])
+                border[self.index(x, y)] = x == 0 or x == self.rows - 1 or y == 0 or y == self.cols - 1
+        return neighbours, surrounding, border
 
     def parse_grid(self, grid_str):
         grid_str = grid_str.replace('\\', '')
@@ -88,142 +244,69 @@ class Grid:
         start_end_pairs_dict = {label: {'start': positions[0], 'end': positions[1], 'label': label} for label, positions in pairs_dict.items()}
         return grid, start_end_pairs_dict, labels
 
-    def is_valid_move(self, x, y, visited):
-        rows, cols = len(self.grid), len(self.grid[0])
-        return 0 <= x < rows and 0 <= y < cols and self.grid[x][y] >= 1 and (x, y) not in visited
+    def is_valid_move(self, index, visited):
+        # visited is a bytearray over cell indices
+        return self.cells[index] == FREE and not visited[index]
+
+    def set_cell(self, index, state):
+        old = self.cells[index]
+        self.undo_log.append((index, old))
+        self.cells[index] = state
+        self.free_cells += (state == FREE) - (old == FREE)
+
+    def restore(self):
+        # Undo the most recent activation still in effect
+        mark = self.undo_marks.pop()
+        while len(self.undo_log) > mark:
+            index, old = self.undo_log.pop()
+            self.free_cells += (old == FREE) - (self.cells[index] == FREE)
+            self.cells[index] = old
 
     def activate_path(self, path_obj=None, value=0, solving_pair_count=-1):
         if solving_pair_count < 0:
             solving_pair_count=len(self.pairs_dict)
         if path_obj is None:
-            # Restore original values from the stack
-            if self.original_values:
-                original_value = self.original_values.pop()
-                for coords, val in original_value.items():
-                    self.grid[coords[0]][coords[1]] = val
+            # Restore original values from the undo log
+            if self.undo_marks:
+                self.restore()
         else:
-            path_coordinates = path_obj.get_path_coordinates()
-            # Save original values to the stack
-            original_value = {}
-            x, y = path_obj.start
-            original_value[(x, y)] = self.grid[x][y]
-            self.grid[x][y] = value
-            for x, y, direction in path_coordinates:
-                if (x, y) not in original_value:
-                    original_value[(x, y)] = self.grid[x][y]
-                self.grid[x][y] = value
-            self.original_values.append(original_value)
-        self.total_traversable = sum(cell == 1 for row in self.grid for cell in row) + solving_pair_count * 2
+            self.undo_marks.append(len(self.undo_log))
+            for x, y in path_obj.coordinates():
+                self.set_cell(self.index(x, y), value + 1)
+        self.total_traversable = self.free_cells + solving_pair_count * 2
 
     def activate_pair(self, pair=None, value=1):
         if pair is None:
-            # Restore original values from the stack
-            if self.original_values:
-                original_value = self.original_values.pop()
-                for coords, val in original_value.items():
-                    self.grid[coords[0]][coords[1]] = val
+            # Restore original values from the undo log
+            if self.undo_marks:
+                self.restore()
         else:
-            start, end = pair['start'], pair['end']
-            # Save original values to the stack
-            original_value = {}
-            if start not in original_value:
-                original_value[start] = self.grid[start[0]][start[1]]
-            if end not in original_value:
-                original_value[end] = self.grid[end[0]][end[1]]
-            self.original_values.append(original_value)
-            # Set new values
-            self.grid[start[0]][start[1]] = value
-            self.grid[end[0]][end[1]] = value
-
-    def is_perimeter(self, x, y, visited, pair, debug=False):
-        # Activate the pair at the beginning
-        self.activate_pair(pair, 0)
-        rows, cols = len(self.grid), len(self.grid[0])
-        
-        # Check if the cell is on the perimeter of the grid
-        if x == 0 or x == rows - 1 or y == 0 or y == cols - 1:
-            self.activate_pair(None)  # Deactivate the pair before returning
-            return 1 if debug else True
+            self.undo_marks.append(len(self.undo_log))
+            for x, y in (pair['start'], pair['end']):
+                self.set_cell(self.index(x, y), value + 1)
 
-        # Directions for 8 adjacent cells
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-        
-        # Check if the cell is adjacent to a non-traversable cell connected to the perimeter
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < rows and 0 <= ny < cols and self.grid[nx][ny] == 0:
-                # Perform a BFS/DFS to check if this non-traversable cell is connected to the perimeter
-                if self.is_connected_to_perimeter(nx, ny, visited.copy()):
-                    self.activate_pair(None)  # Deactivate the pair before returning
-                    return self.is_connected_to_perimeter(nx, ny, visited.copy(), debug) if debug else True
-
-        self.activate_pair(None)  # Deactivate the pair before returning
-        return 0 if debug else False
-
-    def is_connected_to_perimeter(self, x, y, path_visited, debug=False):
-        rows, cols = len(self.grid), len(self.grid[0])
-        path_visited.pop()
-        visited = set()
-        stack = [(x, y)]
-        
-        while stack:
-            cx, cy = stack.pop()
-            if (cx, cy) in visited:
-                continue
-            visited.add((cx, cy))
-            
-            # Check if this cell is on the perimeter
-            if cx == 0 or cx == rows - 1 or cy == 0 or cy == cols - 1:
-                return 3 if debug else True
-
-            # Directions for 4-connected cells (up, down, left, right)
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-            for dx, dy in directions:
-                nx, ny = cx + dx, cy + dy
-                if 0 <= nx < rows and 0 <= ny < cols and (self.grid[nx][ny] == 0 or (nx, ny) in path_visited) and (nx, ny) not in visited:
-                    stack.append((nx, ny))
-        
-        return 4 if debug else False
+    def perimeter_oracle(self, pair=None):
+        # Tracks which cells are on the perimeter during a path search
+        return PerimeterOracle(self, pair)
 
-    def print(self, use_color):
-        grid_copy = [row[:] for row in self.grid]
+    def print(self, use_color, compact=False):
+        grid_copy = self.grid
         for label, pair in self.pairs_dict.items():
             sx, sy = pair['start']
             ex, ey = pair['end']
             grid_copy[sx][sy] = label
             grid_copy[ex][ey] = label
 
-        for row in grid_copy:
-            if use_color:
-                print(' '.join(self.colorize(str(cell)) for cell in row))
-            else:
-                print(' '.join(str(cell) for cell in row))
-        print()
+        if use_color and not compact:
+            write_board([[self.colorize(str(cell)) for cell in row] for row in grid_copy])
+        else:
+            write_board([[str(cell) for cell in row] for row in grid_copy], compact)
 
     def colorize(self, cell):
-        colors = [
-            "\033[97m",  # White
-            "\033[90m",  # Bright Black (Gray)
-            "\033[41m",  # Red Background
-            "\033[42m",  # Green Background
-            "\033[43m",  # Yellow Background
-            "\033[44m",  # Blue Background
-            "\033[45m",  # Magenta Background
-            "\033[46m",  # Cyan Background
-            "\033[47m",  # White Background
-            "\033[91m",  # Red
-            "\033[92m",  # Green
-            "\033[93m",  # Yellow
-            "\033[94m",  # Blue
-            "\033[95m",  # Magenta
-            "\033[96m",  # Cyan
-        ]
-        reset = '\033[0m'
-        color_map = {self.labels[i]: colors[i % len(colors)] for i in range(len(self.labels))}
         if isinstance(cell, tuple):
             direction, label = cell
-            if label in color_map:
-                return f"{color_map[label]}{direction}{reset}"
+            if label in self.colors:
+                return f"{self.colors[label]}{direction}{RESET_COLOR}"
             else:
                 raise ValueError(f"Error: {label} not in color_map")
         else:
@@ -233,12 +316,13 @@ class Grid:
                 return '#'
             elif cell == '-1' or cell == -1:
                 return '*'
-            return f"{color_map.get(cell, '')}{cell}{reset}"
+            return f"{self.colors.get(cell, '')}{cell}{RESET_COLOR}"
 
-    def print_paths(self, paths, use_color, debug_level=0):
-        grid_copy = [row[:] for row in self.grid]
+    def print_paths(self, paths, use_color, debug_level=0, compact=False):
+        grid_copy = self.grid
         for path_obj in paths:
-            if path_obj.directions is None:
+            directions = path_obj.directions
+            if directions is None:
                 continue
             label = path_obj.label
             if debug_level >= 1:
@@ -246,7 +330,7 @@ class Grid:
             sx, sy = path_obj.start
             ex, ey = path_obj.end
             x, y = sx, sy
-            for direction in path_obj.directions:
+            for direction in directions:
                 if direction == '^':
                     x -= 1
                 elif direction == 'v':
@@ -256,33 +340,22 @@ class Grid:
                 elif direction == '>':
                     y += 1
                 if (x, y) != path_obj.start and (x, y) != path_obj.end:  # Check if (x, y) are any of the pairs' start or end coordinates
-                    for other_label, other_pair in self.pairs_dict.items():
-                        if (x, y) == other_pair['start'] or (x, y) == other_pair['end']:
-                            print(f"Conflict: Label {label} attempting to write to coordinate ({x}, {y}) which is start/end of label {other_label}")
+                    other_label = self.endpoints.get((x, y))
+                    if other_label is not None:
+                        print(f"Conflict: Label {label} attempting to write to coordinate ({x}, {y}) which is start/end of label {other_label}")
                 grid_copy[x][y] = (direction, label)
             grid_copy[sx][sy] = label
             grid_copy[ex][ey] = label
 
-        for row in grid_copy:
-            if use_color:
-                print(' '.join(self.colorize(cell) for cell in row))
-            else:
-                #print(' '.join('*' if cell == -1 else str(cell) for cell in row))
-                print(' '.join('*' if cell == -1 else str(cell) if not isinstance(cell, tuple) else cell[0] for cell in row))
-        print()
+        if use_color and not compact:
+            write_board([[self.colorize(cell) for cell in row] for row in grid_copy])
+        else:
+            write_board([['*' if cell == -1 else str(cell) if not isinstance(cell, tuple) else cell[0] for cell in row] for row in grid_copy], compact)
 
     def print_perimeter(self, label=None):
         if label is None or label not in self.pairs_dict:
             print(f"Error: Label '{label}' not found in pairs_dict.")
             return
         
-        pair = self.pairs_dict[label]
-        
-        rows, cols = len(self.grid), len(self.grid[0])
-        
-        for x in range(rows):
-            row_output = []
-            for y in range(cols):
-                row_output.append(str(int(self.is_perimeter(x, y, pair, debug=True))))
-            print(' '.join(row_output))
-        print()
+        oracle = self.perimeter_oracle(self.pairs_dict[label])
+        write_board([[str(int(oracle.is_perimeter(self.index(x, y)))) for y in range(self.cols)] for x in range(self.rows)])
@@ -0,0 +1,104 @@
+import time
+
+class SearchBudget:
+    # Bounds one solve by wall time, by search nodes or by an outside
+    # cancellation, whichever comes first. Searches take an optional budget
+    # and call expired() once per node; the node count is checked every
+    # call, while the clock and the cancel token are only read every
+    # interval calls. cancel can be anything with is_set(), such as a
+    # threading.Event, and cancel() stops the search from another thread.
+    #
+    # The search also reports its progress with reach(), and the deepest
+    # partial state seen (routed paths or placed pieces) is kept in partial
+    # so a stopped solve can still return something useful. reason says why
+    # the search stopped: 'timeout', 'node budget' or 'cancelled'.
+    #
+    # A solve split over processes keeps its node count in shared, a
+    # multiprocessing.Value that the budget of every process adds its nodes
+    # to every interval nodes, so the node budget holds for the solve as a
+    # whole, to within interval nodes per process. share() sets it up.
+    def __init__(self, timeout=None, node_budget=None, cancel=None, interval=256, shared=None):
+        self.deadline = time.time() + timeout if timeout is not None else None
+        self.node_budget = node_budget
+        self.token = cancel
+        self.interval = interval
+        self.shared = shared
+        self.flushed = 0
+        self.nodes = 0
+        self.reason = None
+        self.partial = None
+        self.partial_depth = -1
+
+    def expired(self):
+        if self.reason is not None:
+            return True
+        self.nodes += 1
+        if self.node_budget is not None and self.nodes > self.node_budget:
+            self.reason = 'node budget'
+        elif self.nodes % self.interval == 0:
+            self.check()
+        return self.reason is not None
+
+    def check(self):
+        # Read the clock, the cancel token and the shared node count now,
+        # without counting a node
+        if self.reason is None:
+            if self.shared is not None and self.flush() > self.node_budget:
+                self.reason = 'node budget'
+            elif self.deadline is not None and time.time() >= self.deadline:
+                self.reason = 'timeout'
+            elif self.token is not None and self.token.is_set():
+                self.reason = 'cancelled'
+        return self.reason is not None
+
+    def cancel(self):
+        self.reason = 'cancelled'
+
+    def reach(self, depth, partial, prefix=()):
+        # Keep prefix + partial when it is the deepest state seen so far
+        if depth > self.partial_depth:
+            self.partial_depth = depth
+            self.partial = list(prefix) + list(partial)
+
+    def flush(self):
+        # Add the nodes counted since the last flush to shared and return
+        # the nodes of the whole solve
+        with self.shared.get_lock():
+            self.shared.value += self.nodes - self.flushed
+            total = self.shared.value
+        self.flushed = self.nodes
+        return total
+
+    def share(self, context):
+        # (timeout, node_budget, shared) for the budgets of worker processes
+        # started from context: the time left, and the node budget with the
+        # counter every process of the solve adds its nodes to. This budget
+        # counts against it too, from the nodes it has already used.
+        if self.node_budget is not None and self.shared is None:
+            self.shared = context.Value('q', self.nodes)
+            self.flushed = self.nodes
+        return self.remaining(), self.node_budget, self.shared
+
+    def stopped(self):
+        # Picklable summary a worker process sends back to the parent
+        if self.shared is not None:
+            self.flush()
+        if self.reason is None and self.partial is None:
+            return None
+        return self.reason, self.partial_depth, self.partial
+
+    def merge(self, stopped):
+        # Take in the stopped() of a worker's budget
+        if stopped is not None:
+            reason, depth, partial = stopped
+            if self.reason is None:
+                self.reason = reason
+            if partial is not None:
+                self.reach(depth, partial)
+
+    def remaining(self):
+        # Seconds left before the deadline, for worker processes that set up
+        # a budget of their own
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
@@ -0,0 +1,386 @@
+from grid import Path, MOVE_DELTAS, FREE
+
+# Edge states
+UNKNOWN = 0
+ON = 1
+OFF = 2
+
+class LinkSolver:
+    # Cell-by-cell Numberlink solver. Every edge between two traversable
+    # neighbours is on, off or unknown; free cells need exactly two on edges
+    # and endpoints exactly one. Each cell also keeps a bitmask of the labels
+    # it can still take. Propagation fixes whatever these constraints force
+    # and the search only branches on an edge once propagation stalls.
+    #
+    # All state changes go through assign() so they can be undone from a
+    # trail when backtracking. An optional limits.SearchBudget stops the
+    # search early and keeps the most labels connected so far.
+    def __init__(self, grid_obj, stats=None, budget=None):
+        self.grid_obj = grid_obj
+        self.stats = stats
+        self.budget = budget
+        self.rows, self.cols = grid_obj.rows, grid_obj.cols
+        self.labels = list(grid_obj.pairs_dict)
+        cell_count = self.rows * self.cols
+
+        self.need = [0] * cell_count
+        self.domain = [0] * cell_count
+        all_labels = (1 << len(self.labels)) - 1
+        for index, state in enumerate(grid_obj.cells):
+            if state == FREE:
+                self.need[index] = 2
+                self.domain[index] = all_labels
+        self.endpoints = []
+        for label_index, label in enumerate(self.labels):
+            pair = self.grid_obj.pairs_dict[label]
+            ends = []
+            for x, y in (pair['start'], pair['end']):
+                index = x * self.cols + y
+                self.need[index] = 1
+                self.domain[index] = 1 << label_index
+                ends.append(index)
+            self.endpoints.append(tuple(ends))
+
+        self.cells = [index for index in range(cell_count) if self.need[index]]
+        self.colour = [1 if sum(divmod(index, self.cols)) % 2 == 0 else -1 for index in range(cell_count)]
+        self.edges = []
+        self.cell_edges = [[] for _ in range(cell_count)]
+        for index in self.cells:
+            x, y = divmod(index, self.cols)
+            for nx, ny in ((x + 1, y), (x, y + 1)):
+                if nx < self.rows and ny < self.cols and self.need[nx * self.cols + ny]:
+                    other = nx * self.cols + ny
+                    # Each cell lists its edges with the cell at the other end
+                    self.cell_edges[index].append((len(self.edges), other))
+                    self.cell_edges[other].append((len(self.edges), index))
+                    self.edges.append((index, other))
+
+        self.state = [UNKNOWN] * len(self.edges)
+        self.degree = [0] * cell_count
+        # For a cell at either end of a chain of on edges, the cell at the
+        # other end. Values for cells inside a chain are stale.
+        self.partner = list(range(cell_count))
+        self.trail = []
+        self.nodes = 0
+
+    def assign(self, array, index, value):
+        self.trail.append((array, index, array[index]))
+        array[index] = value
+
+    def undo(self, mark):
+        trail = self.trail
+        while len(trail) > mark:
+            array, index, value = trail.pop()
+            array[index] = value
+
+    def chain_cells(self, end):
+        # Walk a chain of on edges starting from one of its ends
+        cells = [end]
+        previous, current = None, end
+        while True:
+            for edge, nxt in self.cell_edges[current]:
+                if self.state[edge] == ON:
+                    if nxt != previous:
+                        break
+            else:
+                return cells
+            previous, current = current, nxt
+            cells.append(current)
+
+    def set_domain(self, end, domain):
+        for cell in self.chain_cells(end):
+            self.assign(self.domain, cell, domain)
+
+    def set_off(self, edge):
+        self.assign(self.state, edge, OFF)
+        return True
+
+    def set_on(self, edge):
+        u, v = self.edges[edge]
+        if self.degree[u] >= self.need[u] or self.degree[v] >= self.need[v]:
+            return False
+        # Joining the two ends of the same chain would close a loop
+        if self.partner[u] == v:
+            return False
+        domain = self.domain[u] & self.domain[v]
+        if not domain:
+            return False
+
+        end_u, end_v = self.partner[u], self.partner[v]
+        if domain != self.domain[u]:
+            self.set_domain(u, domain)
+        if domain != self.domain[v]:
+            self.set_domain(v, domain)
+        self.assign(self.state, edge, ON)
+        self.assign(self.degree, u, self.degree[u] + 1)
+        self.assign(self.degree, v, self.degree[v] + 1)
+        self.assign(self.partner, end_u, end_v)
+        self.assign(self.partner, end_v, end_u)
+        return True
+
+    def propagate_degrees(self):
+        # Returns None on a contradiction, otherwise whether anything changed
+        changed = False
+        for cell in self.cells:
+            need, degree = self.need[cell], self.degree[cell]
+            unknown = [(edge, other) for edge, other in self.cell_edges[cell] if self.state[edge] == UNKNOWN]
+            if degree + len(unknown) < need:
+                return None  # Dead end: not enough edges left
+            if not unknown:
+                continue
+            if degree == need:
+                for edge, _ in unknown:
+                    self.set_off(edge)
+                changed = True
+            elif degree + len(unknown) == need:
+                # Forced moves: every remaining edge is needed
+                for edge, _ in unknown:
+                    if not self.set_on(edge):
+                        return None
+                changed = True
+            else:
+                for edge, other in unknown:
+                    if not self.domain[cell] & self.domain[other] or self.partner[cell] == other:
+                        self.set_off(edge)
+                        changed = True
+        return changed
+
+    def reachable(self, start, label_bit):
+        # Cells a path from start can still run through under this label.
+        # A chain is entered at one end and can only be left from its far
+        # end, and endpoints other than start are never passed through.
+        tip = self.partner[start] if self.degree[start] else start
+        entered, tips = {start}, {tip}
+        stack = [tip]
+        while stack:
+            cell = stack.pop()
+            if self.degree[cell] == self.need[cell]:
+                continue
+            for edge, other in self.cell_edges[cell]:
+                if self.state[edge] != UNKNOWN:
+                    continue
+                if other in entered or not self.domain[other] & label_bit:
+                    continue
+                entered.add(other)
+                tip = self.partner[other] if self.degree[other] else other
+                if tip not in tips:
+                    tips.add(tip)
+                    if self.need[tip] == 2:
+                        stack.append(tip)
+        return entered | tips
+
+    def label_neighbours(self, cell, label_bit):
+        for edge, other in self.cell_edges[cell]:
+            if self.state[edge] != OFF:
+                if self.domain[other] & label_bit:
+                    yield other
+
+    def bottlenecks(self, start, end, label_bit):
+        # Cells every path between a pair's endpoints has to run through.
+        # Take any one path, then find the span of path positions each piece
+        # of the label's graph off that path can bridge; path cells left
+        # inside no span are cut cells.
+        parent = {start: None}
+        queue = [start]
+        for cell in queue:
+            if cell == end:
+                break
+            for other in self.label_neighbours(cell, label_bit):
+                if other not in parent:
+                    parent[other] = cell
+                    queue.append(other)
+        path = []
+        cell = end
+        while cell is not None:
+            path.append(cell)
+            cell = parent[cell]
+        position = {cell: index for index, cell in enumerate(path)}
+
+        bridged = [0] * (len(path) + 1)
+        seen = set(position)
+        for index, cell in enumerate(path):
+            for other in self.label_neighbours(cell, label_bit):
+                if other in position:
+                    if position[other] > index + 1:
+                        bridged[index + 1] += 1
+                        bridged[position[other]] -= 1
+                    continue
+                if other in seen:
+                    continue
+                seen.add(other)
+                stack = [other]
+                low = high = index
+                while stack:
+                    current = stack.pop()
+                    for nxt in self.label_neighbours(current, label_bit):
+                        if nxt in position:
+                            low, high = min(low, position[nxt]), max(high, position[nxt])
+                        elif nxt not in seen:
+                            seen.add(nxt)
+                            stack.append(nxt)
+                if high > low + 1:
+                    bridged[low + 1] += 1
+                    bridged[high] -= 1
+
+        cuts = []
+        covered = 0
+        for index in range(1, len(path) - 1):
+            covered += bridged[index]
+            if not covered:
+                cuts.append(path[index])
+        return cuts
+
+    def propagate_labels(self):
+        # Drop a label from every open cell that cannot reach both of its
+        # endpoints, along with the rest of that cell's chain. An endpoint
+        # that cannot reach its partner is a cut-off pair, and a cell left
+        # with no label can never be filled. Open cells that are bottlenecks
+        # for a pair can only carry that pair's label.
+        changed = False
+        for label_index, (start, end) in enumerate(self.endpoints):
+            label_bit = 1 << label_index
+            from_start = self.reachable(start, label_bit)
+            if end not in from_start:
+                return None
+            from_end = self.reachable(end, label_bit)
+            for cell in self.cells:
+                if self.degree[cell] == self.need[cell] or not self.domain[cell] & label_bit:
+                    continue
+                if cell not in from_start or cell not in from_end:
+                    domain = self.domain[cell] & ~label_bit
+                    if not domain:
+                        return None
+                    self.set_domain(cell, domain)
+                    changed = True
+            if self.degree[start] and self.partner[start] == end:
+                continue
+            for cell in self.bottlenecks(start, end, label_bit):
+                if self.domain[cell] != label_bit and self.degree[cell] < self.need[cell]:
+                    self.set_domain(cell, label_bit)
+                    changed = True
+        return changed
+
+    def check_regions(self):
+        # Split the open cells into regions joined by undecided edges. What
+        # is left to draw in a region is a set of segments pairing up its
+        # chain ends, so there must be an even number of ends and at least
+        # one (a region without ends could only be covered by a loop). A
+        # segment alternates between black and white squares, so the colour
+        # balance of the region is also fixed by the colours of its ends.
+        seen = set()
+        for cell in self.cells:
+            if cell in seen or self.degree[cell] == self.need[cell]:
+                continue
+            seen.add(cell)
+            stack = [cell]
+            ends, balance, end_balance = 0, 0, 0
+            while stack:
+                current = stack.pop()
+                balance += self.colour[current]
+                if self.need[current] - self.degree[current] == 1:
+                    ends += 1
+                    end_balance += self.colour[current]
+                for edge, other in self.cell_edges[current]:
+                    if self.state[edge] == UNKNOWN:
+                        if other not in seen:
+                            seen.add(other)
+                            stack.append(other)
+            if ends % 2 or not ends or 2 * balance != end_balance:
+                return False
+        return True
+
+    def propagate(self):
+        while True:
+            changed = self.propagate_degrees()
+            if changed is None:
+                return False
+            if changed:
+                continue
+            changed = self.propagate_labels()
+            if changed is None:
+                return False
+            if not changed:
+                return self.check_regions()
+
+    def choose_end(self):
+        # Branch on the open chain end with the fewest ways to continue,
+        # preferring ends of existing chains so paths grow from their tips
+        best_cell, best_key = None, None
+        for cell in self.cells:
+            degree, need = self.degree[cell], self.need[cell]
+            if degree == need:
+                continue
+            options = sum(self.state[edge] == UNKNOWN for edge, _ in self.cell_edges[cell])
+            key = (degree == 0 and need == 2, options, bin(self.domain[cell]).count('1'))
+            if best_key is None or key < best_key:
+                best_cell, best_key = cell, key
+        return best_cell
+
+    def search(self, depth=0):
+        if self.budget is not None and self.budget.expired():
+            return
+        self.nodes += 1
+        if self.stats is not None:
+            self.stats.node('propagate', depth)
+        mark = len(self.trail)
+        if not self.propagate():
+            if self.stats is not None:
+                self.stats.count('dead_ends')
+                self.stats.prune('propagation')
+            self.undo(mark)
+            return
+
+        if self.budget is not None:
+            self.keep_partial()
+        cell = self.choose_end()
+        if cell is None:
+            yield self.build_paths()
+            self.undo(mark)
+            return
+
+        # Try each way out of the chosen end; once a move has been tried it
+        # is switched off for the remaining branches
+        for edge in [edge for edge, _ in self.cell_edges[cell] if self.state[edge] == UNKNOWN]:
+            branch = len(self.trail)
+            if self.set_on(edge):
+                yield from self.search(depth + 1)
+            self.undo(branch)
+            self.set_off(edge)
+        self.undo(mark)
+
+    def keep_partial(self):
+        # Hand the budget the labels whose chain already joins both ends
+        connected = [label_index for label_index, (start, end) in enumerate(self.endpoints) if self.partner[start] == end]
+        if len(connected) > self.budget.partial_depth:
+            self.budget.reach(len(connected), self.build_paths(connected))
+
+    def build_paths(self, label_indices=None):
+        # One Path per label, or only for label_indices, following the on
+        # edges from each start
+        paths = []
+        for label_index in range(len(self.labels)) if label_indices is None else label_indices:
+            label, (start, end) = self.labels[label_index], self.endpoints[label_index]
+            moves, steps = 0, 0
+            previous, current = None, start
+            while current != end:
+                x, y = divmod(current, self.cols)
+                for code, (dx, dy) in enumerate(MOVE_DELTAS):
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < self.rows and 0 <= ny < self.cols):
+                        continue
+                    nxt = nx * self.cols + ny
+                    if nxt != previous and any(self.state[edge] == ON and other == nxt for edge, other in self.cell_edges[current]):
+                        break
+                moves |= code << (2 * steps)
+                steps += 1
+                previous, current = current, nxt
+            paths.append(Path.from_moves(label, divmod(start, self.cols), divmod(end, self.cols), moves, steps))
+        return paths
+
+def solve_grid(grid_obj, limit=None, stats=None, budget=None):
+    # Yield up to limit solutions, each a list of one Path per label
+    solver = LinkSolver(grid_obj, stats, budget)
+    for count, paths in enumerate(solver.search(), 1):
+        yield paths
+        if limit is not None and count >= limit:
+            return
@@ -0,0 +1,42 @@
+import sys
+
+# ANSI escape codes for colors
+COLORS = [
+    "\033[97m",  # White
+    "\033[90m",  # Bright Black (Gray)
+    "\033[41m",  # Red Background
+    "\033[42m",  # Green Background
+    "\033[43m",  # Yellow Background
+    "\033[44m",  # Blue Background
+    "\033[45m",  # Magenta Background
+    "\033[46m",  # Cyan Background
+    "\033[47m",  # White Background
+    "\033[91m",  # Red
+    "\033[92m",  # Green
+    "\033[93m",  # Yellow
+    "\033[94m",  # Blue
+    "\033[95m",  # Magenta
+    "\033[96m",  # Cyan
+]
+
+RESET_COLOR = "\033[0m"
+
+def color_map(labels):
+    # Color of each label, by the order the labels were first seen. Built
+    # once per grid rather than for every cell drawn.
+    return {label: COLORS[i % len(COLORS)] for i, label in enumerate(labels)}
+
+def write_lines(lines):
+    # A whole board in one write instead of a print per row, which on a
+    # terminal is also one flush
+    sys.stdout.write(''.join(line + '\n' for line in lines))
+
+def write_board(rows, compact=False):
+    # Write rows of cell strings with the cells separated by spaces and a
+    # blank line after the board. The compact form, for other programs to
+    # read, is one line in the puzzle string syntax: cells separated by ','
+    # and rows by '.'.
+    if compact:
+        write_lines(['.'.join(','.join(row) for row in rows)])
+    else:
+        write_lines([' '.join(row) for row in rows] + [''])
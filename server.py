@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict
+
+import check_perim
+import connections
+import tangram
+from cache import open_cache
+from limits import SearchBudget
+from stats import SearchStats
+
+# Long-running solver process. Requests come in one JSON object per line,
+# on stdin or on a Unix socket, and each gets one JSON line back:
+#
+#   {"id": 1, "type": "numberlink", "grid": "A,2,B.4.1,C,2.A,C,1,B"}
+#   {"id": 2, "type": "perimeter", "grid": "...", "label": "A"}
+#   {"id": 3, "type": "tangram", "board": "4.4", "pieces": ["1", "3", "2", "1.1"]}
+#
+#   {"id": 1, "ok": true, "result": {...}}
+#   {"id": 2, "ok": false, "error": "..."}
+#
+# Requests are solved concurrently in a pool of worker processes that stay
+# up between requests, so a solve pays neither interpreter start-up nor the
+# imports, and each worker keeps the placement tables of the tangram piece
+# sets it has seen. Responses are written as requests finish, so they can
+# come back out of order; the id, any JSON value, is echoed to match them.
+
+DEFAULT_PLACEMENT_CACHE = 256
+
+class BoundedCache(OrderedDict):
+    # dict that drops its least recently used entry past max_size
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+worker_state = {}
+
+def init_worker(cache_path, use_cache, placement_size, timeout, node_budget):
+    # The solvers print progress and errors; in a worker that output must
+    # not end up in the response stream
+    sys.stdout = sys.stderr
+    worker_state['cache'] = open_cache(cache_path, use_cache)
+    worker_state['placements'] = BoundedCache(placement_size)
+    worker_state['limits'] = (timeout, node_budget)
+
+def warm_up():
+    return os.getpid()
+
+def require(request, field):
+    if field not in request:
+        raise ValueError(f"Missing field '{field}'")
+    return request[field]
+
+def request_budget(request):
+    # A request's own limits take the place of the server's defaults
+    timeout, node_budget = worker_state['limits']
+    timeout = request.get('timeout', timeout)
+    node_budget = request.get('node_budget', node_budget)
+    if timeout is None and node_budget is None:
+        return None
+    return SearchBudget(timeout, node_budget)
+
+def path_json(path):
+    return {'label': path.label, 'start': list(path.start), 'end': list(path.end), 'moves': ''.join(path.directions[:path.steps])}
+
+def solve_numberlink_request(request, stats, budget):
+    result = connections.solve_numberlink(
+        require(request, 'grid'),
+        max_paths=request.get('max_paths', 50000),
+        engine=request.get('engine', 'enumerate'),
+        limit=request.get('limit'),
+        bidirectional=request.get('bidirectional', False),
+        cache=worker_state['cache'],
+        stats=stats,
+        budget=budget,
+    )
+    return {
+        'solutions': [[path_json(path) for path in paths] for paths in result['solutions']],
+        'solution_count': result['solution_count'],
+        'cached': result['cached'],
+        'stopped': result['stopped'],
+        'partial': [path_json(path) for path in result['partial']] if result['partial'] is not None else None,
+    }
+
+def solve_perimeter_request(request, stats, budget):
+    try:
+        grid, pairs, labels = check_perim.parse_grid(require(request, 'grid'))
+    except SystemExit:
+        raise ValueError("Every label needs exactly two cells")
+    label = request.get('label')
+    if label is not None and label not in labels:
+        raise ValueError(f"Label '{label}' not found in the grid")
+    marked = check_perim.perimeter_map(grid, pairs, label)
+    for pair in pairs:
+        for x, y in (pair['start'], pair['end']):
+            marked[x][y] = pair['label']
+    return {'map': [' '.join(str(cell) for cell in row) for row in marked]}
+
+def solve_tangram_request(request, stats, budget):
+    result = tangram.solve_tangram(
+        require(request, 'board'),
+        require(request, 'pieces'),
+        engine=request.get('engine', 'dfs'),
+        limit=request.get('limit', 1),
+        count_only=request.get('count_only', False),
+        symmetry=request.get('symmetry'),
+        prune=request.get('prune', True),
+        tt_size=request.get('tt_size', 100000),
+        cache=worker_state['cache'],
+        stats=stats,
+        budget=budget,
+        placements=worker_state['placements'],
+    )
+    return {
+        'rows': result['rows'],
+        'cols': result['cols'],
+        'solutions': [[list(placement) for placement in solution] for solution in result['solutions']],
+        'solution_count': result['solution_count'],
+        'cached': result['cached'],
+        'stopped': result['stopped'],
+        'partial': [list(placement) for placement in result['partial']] if result['partial'] is not None else None,
+    }
+
+HANDLERS = {
+    'numberlink': solve_numberlink_request,
+    'perimeter': solve_perimeter_request,
+    'tangram': solve_tangram_request,
+}
+
+def handle_request(request):
+    # Runs in a worker process. Requests solve with a single process: the
+    # pool already runs one request per worker.
+    handler = HANDLERS.get(request.get('type'))
+    if handler is None:
+        raise ValueError(f"Unknown request type {request.get('type')!r}, expected one of {', '.join(HANDLERS)}")
+    stats = SearchStats() if request.get('stats') else None
+    result = handler(request, stats, request_budget(request))
+    if stats is not None:
+        result['stats'] = stats.to_dict()
+    return result
+
+async def respond(line, write, pool):
+    loop = asyncio.get_running_loop()
+    request_id = None
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("A request must be a JSON object")
+        request_id = request.get('id')
+        result = await loop.run_in_executor(pool, handle_request, request)
+        response = {'id': request_id, 'ok': True, 'result': result}
+    except Exception as e:
+        response = {'id': request_id, 'ok': False, 'error': str(e) or type(e).__name__}
+    write(json.dumps(response, separators=(',', ':')) + '\n')
+
+async def serve_stream(readline, write, pool):
+    # Start a task per request line and wait for all of them once the
+    # stream ends
+    tasks = set()
+    while True:
+        line = await readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        task = asyncio.ensure_future(respond(line, write, pool))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+async def serve_stdin(pool):
+    # stdin is read in a thread, which works the same for pipes, files and
+    # terminals
+    loop = asyncio.get_running_loop()
+
+    def readline():
+        return loop.run_in_executor(None, sys.stdin.buffer.readline)
+
+    def write(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    await serve_stream(readline, write, pool)
+
+async def serve_socket(pool, path):
+    import stat
+
+    async def client(reader, writer):
+        try:
+            await serve_stream(reader.readline, lambda text: writer.write(text.encode()), pool)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    # A socket left behind by an earlier server is replaced, anything else
+    # at the path is not
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(client, path=path, limit=1 << 24)
+    print(f"Listening on {path}", file=sys.stderr, flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+async def serve(args):
+    import signal
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(args.cache or None, args.cache is not None, args.placement_cache, args.timeout, args.node_budget))
+    loop = asyncio.get_running_loop()
+    # SIGTERM unwinds like Ctrl-C, so the socket file is removed
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        # Start every worker up front so the first requests do not pay for it
+        await asyncio.gather(*(loop.run_in_executor(pool, warm_up) for _ in range(jobs)))
+        if args.socket:
+            await serve_socket(pool, args.socket)
+        else:
+            await serve_stdin(pool)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def main():
+    from cli import CustomArgumentParser
+
+    parser = CustomArgumentParser(description='Serve Numberlink, perimeter map and tangram solves as JSON lines')
+    parser.add_argument('-s', '--socket', type=str, default=None, help="Listen on this Unix socket instead of reading stdin and writing stdout")
+    parser.add_argument('-j', '--jobs', type=int, default=0, help="Number of worker processes (default: 0, one per CPU)")
+    parser.add_argument('--timeout', type=float, default=None, help="Default time limit per request in seconds; requests can set their own")
+    parser.add_argument('--node-budget', type=int, default=None, help="Default node budget per request; requests can set their own")
+    parser.add_argument('--placement-cache', type=int, default=DEFAULT_PLACEMENT_CACHE, help=f"Tangram piece sets whose placement tables each worker keeps (default: {DEFAULT_PLACEMENT_CACHE})")
+    parser.add_argument('--cache', type=str, nargs='?', const='', default=None, metavar='PATH', help="Reuse and store solutions in a cache file (default path: $XDG_CACHE_HOME/puzzle-solvers/solutions.sqlite, with ~/.cache when XDG_CACHE_HOME is not set)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import time
+
+class SearchStats:
+    # Counters and timings for one solve. Searches take an optional stats
+    # argument and only touch it behind `if stats is not None`, so a solve
+    # without statistics pays one comparison per node.
+    #
+    # counters holds totals such as nodes, dead_ends and paths, pruned the
+    # hits of each pruning rule, depths the nodes and wall time per depth of
+    # each named search, and phases the wall time of each phase. Phases nest:
+    # time spent in an inner phase is not charged to the outer one.
+    def __init__(self):
+        self.counters = {}
+        self.pruned = {}
+        self.depths = {}
+        self.phases = {}
+        self.phase_stack = []
+        self.phase_start = None
+        # Depth entry of the most recent node and when it was expanded
+        self.last_entry = None
+        self.last_time = None
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def prune(self, rule, amount=1):
+        self.pruned[rule] = self.pruned.get(rule, 0) + amount
+
+    def node(self, search, depth):
+        # One node expanded at depth of the named search. The wall time
+        # since the previous node is charged to that node's depth.
+        now = time.perf_counter()
+        if self.last_entry is not None:
+            self.last_entry[1] += now - self.last_time
+        levels = self.depths.get(search)
+        if levels is None:
+            levels = self.depths[search] = {}
+        entry = levels.get(depth)
+        if entry is None:
+            entry = levels[depth] = [0, 0.0]
+        entry[0] += 1
+        self.last_entry, self.last_time = entry, now
+        self.counters['nodes'] = self.counters.get('nodes', 0) + 1
+
+    def settle(self):
+        # Charge the time since the last node and stop the depth clock, so
+        # time spent outside the search is not charged to it
+        if self.last_entry is not None:
+            self.last_entry[1] += time.perf_counter() - self.last_time
+            self.last_entry = None
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self.phase_stack:
+            outer = self.phase_stack[-1]
+            self.phases[outer] = self.phases.get(outer, 0.0) + now - self.phase_start
+        self.phase_stack.append(name)
+        self.phase_start = now
+
+    def leave(self):
+        now = time.perf_counter()
+        name = self.phase_stack.pop()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.phase_start
+        self.phase_start = now
+        self.settle()
+
+    def merge(self, other):
+        # Add in the to_dict() of another run, such as a worker process
+        for name, amount in other['counters'].items():
+            self.count(name, amount)
+        for rule, amount in other['pruned'].items():
+            self.prune(rule, amount)
+        for name, seconds in other['phases'].items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for search, levels in other['depths'].items():
+            mine = self.depths.setdefault(search, {})
+            for depth, level in levels.items():
+                entry = mine.setdefault(int(depth), [0, 0.0])
+                entry[0] += level['nodes']
+                entry[1] += level['seconds']
+
+    def to_dict(self):
+        self.settle()
+        return {
+            'counters': dict(self.counters),
+            'pruned': dict(self.pruned),
+            'phases': dict(self.phases),
+            'depths': {search: {depth: {'nodes': nodes, 'seconds': seconds} for depth, (nodes, seconds) in sorted(levels.items())}
+                       for search, levels in self.depths.items()},
+        }
+
+    def to_json(self):
+        import json
+
+        return json.dumps(self.to_dict())
+
+    def print(self):
+        data = self.to_dict()
+        print("Search statistics:")
+        for name, amount in data['counters'].items():
+            print(f"  {name}: {amount}")
+        for rule, amount in data['pruned'].items():
+            print(f"  pruned by {rule}: {amount}")
+        for name, seconds in data['phases'].items():
+            print(f"  {name} phase: {seconds:.4f}s")
+        for search, levels in data['depths'].items():
+            print(f"  {search} search by depth:")
+            for depth, level in levels.items():
+                print(f"    {depth}: {level['nodes']} nodes, {level['seconds']:.4f}s")
+
+class Phase:
+    # Context manager timing one phase of stats; does nothing without stats
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        if self.stats is not None:
+            self.stats.enter(self.name)
+
+    def __exit__(self, *exc_info):
+        if self.stats is not None:
+            self.stats.leave()
+
+def report(stats, output_format):
+    # CLI helper for --stats: a readable summary or one line of JSON
+    if stats is None:
+        return
+    if output_format == 'json':
+        print(stats.to_json())
+    else:
+        stats.print()
@@ -1,27 +1,14 @@
-import argparse
-import string
-import sys
-
-# ANSI escape codes for colors
-COLORS = [
-    "\033[97m",  # White
-    "\033[90m",  # Bright Black (Gray)
-    "\033[41m",  # Red Background
-    "\033[42m",  # Green Background
-    "\033[43m",  # Yellow Background
-    "\033[44m",  # Blue Background
-    "\033[45m",  # Magenta Background
-    "\033[46m",  # Cyan Background
-    "\033[47m",  # White Background
-    "\033[91m",  # Red
-    "\033[92m",  # Green
-    "\033[93m",  # Yellow
-    "\033[94m",  # Blue
-    "\033[95m",  # Magenta
-    "\033[96m",  # Cyan
-]
-
-RESET_COLOR = "\033[0m"
+import itertools
+from collections import Counter, OrderedDict
+
+from cache import SYMMETRIES, puzzle_key, open_cache
+from limits import SearchBudget
+from render import COLORS, RESET_COLOR, write_board, write_lines
+from stats import SearchStats, Phase, report
+
+# The dihedral group of a rectangle without the identity, as maps of
+# (row, col) inside a rows x cols box
+BOARD_SYMMETRIES = SYMMETRIES[1:]
 
 def get_max_row_length(board_str):
     rows = board_str.split('.')
@@ -37,7 +24,7 @@ def get_max_row_length(board_str):
                 row_length += 1
             else:
                 try:
-                    row_length += int(elem, 16)
+                    row_length += abs(int(elem))
                 except ValueError:
                     raise ValueError(f"Invalid element '{elem}' in board string.")
         max_length = max(max_length, row_length)
@@ -75,29 +62,98 @@ def parse_board_or_piece(input_str, max_length):
 def convert_to_1d_bitmap(bit_array):
     return [bit for row in bit_array for bit in row]
 
-def count_piece_fits(board_bitmap, piece_bitmap, max_row_length, verbosity):
-    board_len = len(board_bitmap)
-    piece_len = len(piece_bitmap)
-    count = 0
+def bitmap_to_int(bitmap):
+    # Pack a 1D bitmap into a bitboard: bit i is set when cell i is a 1
+    bitboard = 0
+    for i, bit in enumerate(bitmap):
+        if bit:
+            bitboard |= 1 << i
+    return bitboard
 
-    for shift in range(board_len - piece_len + 1):
-        # Shift the padded piece bitmap
-        shifted_piece_bitmap = [0] * shift + piece_bitmap + [0] * (board_len - (piece_len + shift))
-        
-        # Perform bitwise AND operation
-        bitwise_and_bitmap = [(board_bitmap[k] & shifted_piece_bitmap[k]) for k in range(board_len)]
-        
-        if verbosity >= 3:
+def int_to_bitmap(bitboard, length):
+    return [(bitboard >> i) & 1 for i in range(length)]
+
+def normalize_piece(piece):
+    # Shift the piece so its first cell is bit 0; identical shapes then compare equal
+    if not piece:
+        return piece
+    return piece >> ((piece & -piece).bit_length() - 1)
+
+def find_piece_shifts(board, piece):
+    # A piece can only fit if its lowest cell lands on a board cell, so only
+    # try the shifts that line it up with each set bit of the board
+    if not piece:
+        return []
+    lowest = (piece & -piece).bit_length() - 1
+    free = ~board
+    shifts = []
+    remaining = board
+    while remaining:
+        cell = remaining & -remaining
+        remaining ^= cell
+        shift = cell.bit_length() - 1 - lowest
+        if shift >= 0 and (piece << shift) & free == 0:
+            shifts.append(shift)
+    return shifts
+
+# Importing NumPy costs about 0.1s, which the Python backend only catches up
+# with at around 150000 board cells times pieces, so 'auto' stays in pure
+# Python below that
+NUMPY_MIN_WORK = 150000
+
+def load_board_grid(board_array, backend='auto', piece_count=1):
+    # Returns the board as a uint8 NumPy array for the numpy backend, or None
+    # to use the pure Python backend. NumPy is optional, so 'auto' falls back
+    # to Python when it is not installed, and also for puzzles too small to
+    # pay for the import.
+    if backend == 'python':
+        return None
+    if backend == 'auto' and sum(map(sum, board_array)) * piece_count < NUMPY_MIN_WORK:
+        return None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy.array(board_array, dtype=numpy.uint8)
+
+def find_piece_shifts_numpy(board_grid, piece_array):
+    # Find every 2D placement at once: slide a piece-sized window over the
+    # board and keep the windows whose correlation with the piece covers all
+    # of its cells. Returns the same shifts as find_piece_shifts.
+    import numpy
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    piece_grid = numpy.array(piece_array, dtype=numpy.uint8)
+    piece_rows = numpy.flatnonzero(piece_grid.any(axis=1))
+    piece_cols = numpy.flatnonzero(piece_grid.any(axis=0))
+    if piece_rows.size == 0:
+        return []
+    piece_grid = piece_grid[piece_rows[0]:piece_rows[-1] + 1, piece_cols[0]:piece_cols[-1] + 1]
+    height, width = piece_grid.shape
+    rows, stride = board_grid.shape
+    if height > rows or width > stride:
+        return []
+
+    windows = sliding_window_view(board_grid, (height, width))
+    covered = numpy.einsum('ijkl,kl->ij', windows, piece_grid, dtype=numpy.int32)
+    fit_rows, fit_cols = numpy.nonzero(covered == int(piece_grid.sum()))
+    # A normalized piece is anchored on its first cell, which sits in the top
+    # row of its bounding box
+    first_col = int(numpy.flatnonzero(piece_grid[0])[0])
+    return (fit_rows * stride + fit_cols + first_col).tolist()
+
+def count_piece_fits(board, piece, board_len, verbosity):
+    if verbosity >= 3:
+        piece_len = piece.bit_length()
+        for shift in range(board_len - piece_len + 1):
+            shifted_piece = piece << shift
             print(f"\nBoard Length:Piece Length & Shift: {board_len}:{piece_len} & {shift}")
             print("Padded Piece Bitmap:")
-            print_1d_bitmap(shifted_piece_bitmap)
+            print_1d_bitmap(int_to_bitmap(shifted_piece, board_len))
             print("Bitwise AND Bitmap:")
-            print_1d_bitmap(bitwise_and_bitmap)
-        
-        if all((board_bitmap[k] & shifted_piece_bitmap[k]) == shifted_piece_bitmap[k] for k in range(board_len)):
-            count += 1
+            print_1d_bitmap(int_to_bitmap(board & shifted_piece, board_len))
 
-    return count
+    return len(find_piece_shifts(board, piece))
 
 def shift_board_bitmap(board_bitmap, max_row_length):
     board_len = len(board_bitmap)
@@ -105,185 +161,1041 @@ def shift_board_bitmap(board_bitmap, max_row_length):
     shifted_board_bitmap = [0] * shift_amount + board_bitmap[:max_row_length]
     return shifted_board_bitmap
 
-def print_bit_array(bit_array, piece_number=None, use_color=False, verbosity=0):
+def print_bit_array(bit_array, piece_number=None, use_color=False, verbosity=0, compact=False):
+    import string
+
     # Calculate max_length based on the position of the furthest non-zero element in any row
     reset = RESET_COLOR if use_color else ""
     max_length = max((len(row) - next((i for i, x in enumerate(reversed(row)) if x != 0 and x != ' ' and x != reset + " "), len(row)) for row in bit_array))
     max_row = max(bit_array, key=len)
     if verbosity >= 3:
         print(f"\nLongest row: {max_length}\n{max_row}")
-    
+
+    if compact:
+        # Board cells as '#', or as the piece's letter, and '_' off the board
+        fill = string.ascii_letters[piece_number - 1] if piece_number is not None else '#'
+        write_board([[fill if x == 1 else '_' if x == 0 or x == ' ' else str(x) for x in row[:max_length]] for row in bit_array], compact=True)
+        return
+
+    # The framed board is assembled first and written in one go
     if piece_number is not None:
         letter = string.ascii_letters[piece_number - 1]
         color = COLORS[piece_number % len(COLORS)] if use_color else ""
         reset = RESET_COLOR if use_color else ""
-        print("+" + "-" * (max_length * 2) + "+")
+        lines = ["+" + "-" * (max_length * 2) + "+"]
         for row in bit_array:
             row_str = ' '.join(color + letter if x == 1 else reset + " " for x in row[:max_length]) + " "
-            print("|" + row_str + reset + " " * (max_length * 2 - 1 - len(row_str)) + "|")
-        print("+" + "-" * (max_length * 2) + "+")
+            lines.append("|" + row_str + reset + " " * (max_length * 2 - 1 - len(row_str)) + "|")
+        lines.append("+" + "-" * (max_length * 2) + "+")
     else:
-        print("+" + "-" * (max_length * 2 + 1) + "+")
+        lines = ["+" + "-" * (max_length * 2 + 1) + "+"]
         for row in bit_array:
             if use_color:
                 color = COLORS[0]
                 row_str = ' ' + ' '.join((color + "#" + reset if x == 1 else "_" if x == 0 else str(x) for x in row[:max_length]))
             else:
                 row_str = ' ' + ' '.join(("#" if x == 1 else "_" if x == 0 else str(x) for x in row[:max_length]))
-            print("|" + row_str + " " + reset + " " * (max_length * 2 - 2 - len(row_str)) + "|")
-        print("+" + "-" * (max_length * 2 + 1) + "+")
+            lines.append("|" + row_str + " " + reset + " " * (max_length * 2 - 2 - len(row_str)) + "|")
+        lines.append("+" + "-" * (max_length * 2 + 1) + "+")
+    write_lines(lines)
 
 def print_1d_bitmap(bitmap):
     print(' '.join(map(str, bitmap)))
 
-def subtract_bitmaps(board_bitmap, piece_bitmap):
-    return [board_bitmap[i] - piece_bitmap[i] for i in range(len(board_bitmap))]
-
-def is_all_zeros(bitmap):
-    return all(bit == 0 for bit in bitmap)
-
 def convert_1d_to_2d(bitmap, rows, cols):
     return [bitmap[i * cols:(i + 1) * cols] for i in range(rows)]
 
-def place_piece_on_board(board_2d, piece_bitmap, shift, piece_number, max_row_length, use_color=False):
+def place_piece_on_board(board_2d, piece, shift, piece_number, max_row_length, use_color=False):
+    import string
     letter = string.ascii_letters[piece_number - 1]
     color = COLORS[piece_number % len(COLORS)] if use_color else ""
     reset = RESET_COLOR if use_color else ""
-    piece_len = len(piece_bitmap)
-    board_len = len(board_2d) * len(board_2d[0])
-    shifted_piece_bitmap = [0] * shift + piece_bitmap + [0] * (board_len - piece_len - shift)
-    rows = len(board_2d)
     cols = len(board_2d[0])
+    shifted_piece = piece << shift
 
-    for i in range(rows):
-        for j in range(cols):
-            index = i * cols + j
-            if index < len(shifted_piece_bitmap) and shifted_piece_bitmap[index] == 1:
-                #board_2d[i][j] = color + letter + reset
-                board_2d[i][j] = reset + color + letter
+    while shifted_piece:
+        cell = shifted_piece & -shifted_piece
+        shifted_piece ^= cell
+        index = cell.bit_length() - 1
+        #board_2d[index // cols][index % cols] = color + letter + reset
+        board_2d[index // cols][index % cols] = reset + color + letter
 
-def solve_recursive(board_bitmap, pieces, max_row_length, solution, board_2d, verbosity, use_color=False):
-    if is_all_zeros(board_bitmap):
-        print("Solution found:")
-        print_bit_array(board_2d, use_color=use_color, verbosity=args.v)
-        return True
+def bitboard_cells(bitboard, stride):
+    cells = []
+    while bitboard:
+        cell = bitboard & -bitboard
+        bitboard ^= cell
+        cells.append(divmod(cell.bit_length() - 1, stride))
+    return cells
 
-    if not pieces:
-        return False
+def normalize_cells(cells):
+    min_row = min(r for r, _ in cells)
+    min_col = min(c for _, c in cells)
+    return frozenset((r - min_row, c - min_col) for r, c in cells)
 
-    piece_number, piece_bitmap = pieces[0]
-    remaining_pieces = pieces[1:]
+def transform_cells(cells, transform):
+    rows = max(r for r, _ in cells) + 1
+    cols = max(c for _, c in cells) + 1
+    return normalize_cells([transform(r, c, rows, cols) for r, c in cells])
 
-    board_len = len(board_bitmap)
-    piece_len = len(piece_bitmap)
+def piece_shape(piece, max_row_length, stride):
+    # A normalized piece can have cells left of its first cell, so move it
+    # max_row_length columns right before reading its 2D coordinates back
+    return normalize_cells(bitboard_cells(piece << max_row_length, stride))
 
-    for shift in range(board_len - piece_len + 1 + max_row_length):
-        shifted_piece_bitmap = [0] * shift + piece_bitmap + [0] * (board_len - piece_len - shift)
-        
-        if all((board_bitmap[k] & shifted_piece_bitmap[k]) == shifted_piece_bitmap[k] for k in range(board_len)):
-            new_board_bitmap = subtract_bitmaps(board_bitmap, shifted_piece_bitmap)
-            new_board_2d = [row[:] for row in board_2d]  # Deep copy of the board
-            place_piece_on_board(new_board_2d, piece_bitmap, shift, piece_number, max_row_length, use_color)
-            new_solution = solution + [(piece_number, shift)]
-            if solve_recursive(new_board_bitmap, remaining_pieces, max_length, new_solution, new_board_2d, verbosity, use_color):
-                return True
+def find_symmetries(board, pieces, max_row_length, stride):
+    # A board symmetry only maps solutions onto solutions when it also maps
+    # the piece set onto itself, since pieces are never rotated
+    if not board or not all(piece for _, piece, _ in pieces):
+        return []
+    board_cells = normalize_cells(bitboard_cells(board, stride))
+    shapes = Counter(piece_shape(piece, max_row_length, stride) for _, piece, _ in pieces)
 
-    return False
+    symmetries = []
+    for transform in BOARD_SYMMETRIES:
+        if transform_cells(board_cells, transform) != board_cells:
+            continue
+        if Counter(transform_cells(shape, transform) for shape in shapes.elements()) != shapes:
+            continue
+        symmetries.append(transform)
+    return symmetries
 
-class CustomArgumentParser(argparse.ArgumentParser):
-    def error(self, message):
-        # Check if any argument starts with a '-'
-        for arg in sys.argv[1:]:
-            if arg.startswith('-') and not arg.startswith('--'):
-                message += "\nIf an argument starts with a '-', please escape it with a '\\'."
+def break_symmetry(board, pieces, max_row_length, stride, verbosity):
+    # Restrict one unique piece to a single placement per orbit of the
+    # symmetries that leave its shape unchanged. Every solution has an image
+    # under one of them with that piece on a representative placement.
+    symmetries = find_symmetries(board, pieces, max_row_length, stride)
+    if verbosity >= 1:
+        print(f"Board symmetry group order: {len(symmetries) + 1}")
+    if not symmetries:
+        return pieces
+
+    counts = Counter(piece for _, piece, _ in pieces)
+    best_index, best_stabilizer = None, []
+    for index, (piece_number, piece, shifts) in enumerate(pieces):
+        if counts[piece] > 1:
+            continue
+        shape = piece_shape(piece, max_row_length, stride)
+        stabilizer = [transform for transform in symmetries if transform_cells(shape, transform) == shape]
+        if len(stabilizer) > len(best_stabilizer):
+            best_index, best_stabilizer = index, stabilizer
+    if best_index is None:
+        return pieces
+
+    board_cells = bitboard_cells(board, stride)
+    min_row = min(r for r, _ in board_cells)
+    min_col = min(c for _, c in board_cells)
+    rows = max(r for r, _ in board_cells) - min_row + 1
+    cols = max(c for _, c in board_cells) - min_col + 1
+
+    piece_number, piece, shifts = pieces[best_index]
+    representatives = []
+    for shift in shifts:
+        placement = piece << shift
+        cells = [(r - min_row, c - min_col) for r, c in bitboard_cells(placement, stride)]
+        for transform in best_stabilizer:
+            image = 0
+            for r, c in cells:
+                tr, tc = transform(r, c, rows, cols)
+                image |= 1 << ((tr + min_row) * stride + tc + min_col)
+            if image < placement:
                 break
-        self.print_usage(sys.stderr)
-        self.exit(2, f"Error parsing arguments: {message}\n")
-
-parser = CustomArgumentParser(description='Solve tangram style grid puzzles')
-parser.add_argument('-b', '--board', type=str, required=True, help='Board definition string.')
-parser.add_argument('-p', '--pieces', type=str, nargs='*', help='Piece definition strings.')
-parser.add_argument('-v', action='count', default=0, help='Increase verbosity level. Up to -vvv.')
-parser.add_argument('-s', '--solve', action='store_true', help='Check if the puzzle is solvable. Returns 1st solution, not all..')
-parser.add_argument('-c', '--color', action='store_true', help='Enable color coding for the pieces.')
-
-try:
-    args = parser.parse_args()
-except argparse.ArgumentError as e:
-    print(f"Error parsing arguments: {e}")
-    exit()
-
-# Remove leading backslashes
-board = args.board.replace('\\', '')
-# Replace semicolons with commas
-board = board.replace(';', '.')
-
-try:
-    max_length = get_max_row_length(board)
-    board_array = parse_board_or_piece(board, max_length)
-except ValueError as e:
-    print(f"Error parsing board: {e}")
-    exit()
-
-board_bitmap = convert_to_1d_bitmap(board_array)
-
-print("Board:")
-print_bit_array(board_array, use_color=args.color)
-
-if args.v >= 1:
-    print("1D Board Bitmap:")
-    print_1d_bitmap(board_bitmap)
-
-piece_fits = []
-total_piece_ones = 0
-piece_arrays = []
-
-if args.pieces:
-    for i, piece in enumerate(args.pieces):
-        # Remove leading backslashes
-        piece = piece.replace('\\', '')
-        # Replace semicolons with commas
-        piece = piece.replace(';', '.')
-        try:
-            piece_array = parse_board_or_piece(piece, max_length)
-            piece_arrays.append(piece_array)
-        except ValueError as e:
-        # Enhance the error message with additional information
-            error_message = str(e)
-            if any(part.startswith('-') for part in args.board.split(',')):
-                error_message += " If an argument starts with a '-', please escape it with a '\\'."
-            print(f"Error parsing piece {i+1}: {error_message}")
+        else:
+            representatives.append(shift)
+
+    if verbosity >= 1:
+        print(f"Piece {piece_number} limited to {len(representatives)} of {len(shifts)} placements by board symmetry.")
+    pieces = list(pieces)
+    pieces[best_index] = (piece_number, piece, representatives)
+    return pieces
+
+def dead_region_tables(pieces):
+    # For each depth, the smallest remaining piece and a bitset of every area
+    # a subset of the remaining pieces can add up to
+    tables = [None] * len(pieces)
+    sums = 1
+    min_size = None
+    for depth in range(len(pieces) - 1, -1, -1):
+        size = pieces[depth][1].bit_count()
+        sums |= sums << size
+        min_size = size if min_size is None else min(min_size, size)
+        tables[depth] = (min_size, sums)
+    return tables
+
+def has_dead_region(board, stride, min_size, sums):
+    # Flood fill each group of connected empty cells with whole-board shifts.
+    # Row padding keeps the one-cell shifts from wrapping between rows.
+    remaining = board
+    while remaining:
+        region = remaining & -remaining
+        while True:
+            grown = (region | (region << 1) | (region >> 1) | (region << stride) | (region >> stride)) & remaining
+            if grown == region:
+                break
+            region = grown
+        remaining ^= region
+        area = region.bit_count()
+        if area < min_size or not (sums >> area) & 1:
+            return True
+    return False
+
+class TranspositionTable:
+    # Bounded set of search states known to have no solution, evicting the
+    # least recently used state once max_size is reached
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def is_dead(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add_dead(self, key):
+        self.entries[key] = None
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+def solve_recursive(board, pieces, depth=0, solution=None, min_shift=0, cancel=None, prune=None, table=None, stats=None, budget=None):
+    # Yield every solution below this node as a tuple of (piece_number, shift)
+    # placements. Pieces are placed in list order, so the remaining pieces are
+    # always pieces[depth:]. prune is an optional (stride, dead_region_tables)
+    # pair that rejects boards split into regions the pieces cannot fill.
+    # table is an optional TranspositionTable of dead states, stats an
+    # optional SearchStats and budget an optional SearchBudget, which keeps
+    # the most pieces placed at once.
+    if solution is None:
+        solution = []
+
+    if cancel is not None and cancel.is_set():
+        return
+    if budget is not None:
+        if budget.expired():
+            return
+        budget.reach(depth, solution)
+    if stats is not None:
+        stats.node('pieces', depth)
+
+    if not board:
+        yield tuple(solution)
+        return
+
+    if depth == len(pieces):
+        return
+
+    # The remaining pieces are fixed by depth, so (board, depth) identifies the
+    # remaining board and piece multiset no matter which placements led here
+    key = (board, depth, min_shift)
+    if table is not None and table.is_dead(key):
+        if stats is not None:
+            stats.prune('transposition')
+        return
+
+    if prune is not None and has_dead_region(board, prune[0], *prune[1][depth]):
+        if stats is not None:
+            stats.prune('dead region')
+        if table is not None:
+            table.add_dead(key)
+        return
+
+    piece_number, piece, shifts = pieces[depth]
+    free = ~board
+    # Identical pieces are placed in increasing shift order so each
+    # arrangement of a repeated shape is only searched once
+    next_is_same = depth + 1 < len(pieces) and pieces[depth + 1][1] == piece
+    found = False
+
+    for shift in shifts:
+        if shift < min_shift:
             continue
+        shifted_piece = piece << shift
 
-        piece_bitmap = convert_to_1d_bitmap(piece_array)
-        fits = count_piece_fits(board_bitmap, piece_bitmap, max_length, args.v)
-        piece_fits.append((i + 1, piece_bitmap, fits))
-        total_piece_ones += sum(piece_bitmap)
+        if shifted_piece & free == 0:
+            solution.append((piece_number, shift))
+            for found_solution in solve_recursive(board ^ shifted_piece, pieces, depth + 1, solution, shift + 1 if next_is_same else 0, cancel, prune, table, stats, budget):
+                found = True
+                yield found_solution
+            solution.pop()
 
-# Sort pieces by the number of fits (ascending order)
-piece_fits.sort(key=lambda x: x[2])
+    if stats is not None and not found:
+        stats.count('dead_ends')
+    # A cancelled subtree was not fully searched, so it is not known to be dead
+    if table is not None and not found and not (cancel is not None and cancel.is_set()) and not (budget is not None and budget.reason is not None):
+        table.add_dead(key)
 
-# Create a mapping from piece number to piece array
-piece_array_map = {i + 1: piece_arrays[i] for i in range(len(piece_arrays))}
+class DancingLinks:
+    # Knuth's Algorithm X on a dancing-links matrix. Nodes live in flat lists
+    # (left, right, up, down, column) instead of objects; node 0 is the root
+    # and nodes 1..num_columns are the column headers.
+    #
+    # A column with a multiplicity above 1 stands for several identical pieces.
+    # It is left out of the header ring, so it is never branched on, and is
+    # only covered once that many of its rows have been chosen.
+    def __init__(self, num_columns, multiplicities=None):
+        self.left = [0] * (num_columns + 1)
+        self.right = [0] * (num_columns + 1)
+        self.up = list(range(num_columns + 1))
+        self.down = list(range(num_columns + 1))
+        self.column = list(range(num_columns + 1))
+        self.size = [0] * (num_columns + 1)
+        self.row_data = [None] * (num_columns + 1)
+        self.remaining = [1] * (num_columns + 1)
 
-for piece_info in piece_fits:
-    piece_number, piece_bitmap, fits = piece_info
-    piece_array = piece_array_map[piece_number]
-    print(f"\nPiece {piece_number}:")
-    print_bit_array(piece_array, piece_number, use_color=args.color, verbosity=args.v)
-    if args.v >= 1:
-        print(f"1D Piece {piece_number} Bitmap:")
-        print_1d_bitmap(piece_bitmap)
-    print(f"Piece {piece_number} fits {fits} times in the board.")
+        last = 0
+        for col in range(1, num_columns + 1):
+            if multiplicities is not None and multiplicities[col - 1] > 1:
+                self.remaining[col] = multiplicities[col - 1]
+                self.left[col] = self.right[col] = col
+                continue
+            self.left[col] = last
+            self.right[last] = col
+            last = col
+        self.right[last] = 0
+        self.left[0] = last
+
+    def add_row(self, columns, data):
+        first = None
+        for col in columns:
+            col += 1  # Skip the root node
+            node = len(self.column)
+            self.column.append(col)
+            self.row_data.append(data)
+            self.up.append(self.up[col])
+            self.down.append(col)
+            self.down[self.up[col]] = node
+            self.up[col] = node
+            self.size[col] += 1
+            if first is None:
+                first = node
+                self.left.append(node)
+                self.right.append(node)
+            else:
+                self.left.append(self.left[first])
+                self.right.append(first)
+                self.right[self.left[first]] = node
+                self.left[first] = node
+
+    def cover(self, col):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[col]] = right[col]
+        left[right[col]] = left[col]
+        i = down[col]
+        while i != col:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, col):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[col]
+        while i != col:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[col]] = col
+        left[right[col]] = col
+
+    def select(self, col):
+        self.remaining[col] -= 1
+        if self.remaining[col] == 0:
+            self.cover(col)
+
+    def unselect(self, col):
+        if self.remaining[col] == 0:
+            self.uncover(col)
+        self.remaining[col] += 1
+
+    def choose_column(self):
+        # Branch on the column with the fewest remaining candidates
+        right, size = self.right, self.size
+        best = None
+        best_size = None
+        col = right[0]
+        while col != 0:
+            if best_size is None or size[col] < best_size:
+                best, best_size = col, size[col]
+                if best_size <= 1:
+                    break
+            col = right[col]
+        return best
+
+    def search(self, solution=None, cancel=None, stats=None, budget=None):
+        # Yield each exact cover as a list of the row data of the chosen rows
+        if solution is None:
+            solution = []
+        if cancel is not None and cancel.is_set():
+            return
+        if budget is not None:
+            if budget.expired():
+                return
+            budget.reach(len(solution), solution)
+        if stats is not None:
+            stats.node('dlx', len(solution))
+        if self.right[0] == 0:
+            yield list(solution)
+            return
+
+        col = self.choose_column()
+        if self.size[col] == 0:
+            if stats is not None:
+                stats.prune('empty column')
+            return
+
+        self.cover(col)
+        i = self.down[col]
+        while i != col:
+            solution.append(self.row_data[i])
+            j = self.right[i]
+            while j != i:
+                self.select(self.column[j])
+                j = self.right[j]
+
+            yield from self.search(solution, cancel, stats, budget)
+
+            j = self.left[i]
+            while j != i:
+                self.unselect(self.column[j])
+                j = self.left[j]
+            solution.pop()
+            i = self.down[i]
+        self.uncover(col)
+
+def group_identical_pieces(pieces):
+    groups = {}
+    for piece_number, piece, shifts in pieces:
+        if piece in groups:
+            groups[piece][0].append(piece_number)
+        else:
+            groups[piece] = ([piece_number], shifts)
+    return [(piece_numbers, piece, shifts) for piece, (piece_numbers, shifts) in groups.items()]
+
+def build_exact_cover(board, pieces):
+    # One column per board cell followed by one column per distinct piece
+    # shape, and one row per legal placement covering its cells and its shape.
+    # Repeated shapes share a column with a multiplicity so that swapping two
+    # identical pieces does not count as a different cover.
+    cell_columns = {}
+    remaining = board
+    while remaining:
+        cell = remaining & -remaining
+        remaining ^= cell
+        cell_columns[cell.bit_length() - 1] = len(cell_columns)
+
+    groups = group_identical_pieces(pieces)
+    multiplicities = [1] * len(cell_columns) + [len(piece_numbers) for piece_numbers, _, _ in groups]
+    matrix = DancingLinks(len(cell_columns) + len(groups), multiplicities)
+    for group_index, (piece_numbers, piece, shifts) in enumerate(groups):
+        piece_column = len(cell_columns) + group_index
+        for shift in shifts:
+            columns = []
+            shifted_piece = piece << shift
+            if shifted_piece & ~board:
+                continue
+            while shifted_piece:
+                cell = shifted_piece & -shifted_piece
+                shifted_piece ^= cell
+                columns.append(cell_columns[cell.bit_length() - 1])
+            columns.append(piece_column)
+            matrix.add_row(columns, (group_index, shift))
+    return matrix, groups
+
+def assign_group_placements(solution, groups):
+    # Give the copies of a repeated shape their placements in shift order
+    placements = []
+    group_shifts = {}
+    for group_index, shift in solution:
+        group_shifts.setdefault(group_index, []).append(shift)
+    for group_index, shifts in group_shifts.items():
+        piece_numbers, piece, _ = groups[group_index]
+        for piece_number, shift in zip(piece_numbers, sorted(shifts)):
+            placements.append((piece_number, piece, shift))
+    return placements
 
-if args.solve:
-    total_board_ones = sum(board_bitmap)
+def solve_dlx(board, pieces, verbosity=0, cancel=None, stats=None, budget=None, prefix=()):
+    # prefix holds placements already made on board; the rows chosen by the
+    # search follow them, so depths count every piece placed
+    matrix, groups = build_exact_cover(board, pieces)
+    if verbosity >= 2:
+        print(f"Exact cover matrix: {len(matrix.size) - 1} columns, {len(matrix.column) - len(matrix.size)} nodes")
+
+    placed = len(prefix)
+    kept = budget.partial_depth if budget is not None else None
+    try:
+        for solution in matrix.search(list(prefix), cancel, stats, budget):
+            yield tuple(prefix) + tuple((piece_number, shift) for piece_number, piece, shift in assign_group_placements(solution[placed:], groups))
+    finally:
+        # The budget kept exact cover rows; turn them into placements
+        if budget is not None and budget.partial_depth > kept:
+            rows = budget.partial[placed:]
+            budget.partial = budget.partial[:placed] + [(piece_number, shift) for piece_number, piece, shift in assign_group_placements(rows, groups)]
+
+def iter_solutions(board, pieces, engine='dfs', verbosity=0, stride=None, table=None, stats=None, budget=None):
+    if engine == 'dlx':
+        return solve_dlx(board, pieces, verbosity, stats=stats, budget=budget)
+    prune = (stride, dead_region_tables(pieces)) if stride is not None else None
+    return solve_recursive(board, pieces, prune=prune, table=table, stats=stats, budget=budget)
+
+class PollingEvent:
+    # Only look at the shared event every few hundred checks, since reading a
+    # multiprocessing.Event takes a lock
+    def __init__(self, event, interval=256):
+        self.event = event
+        self.interval = interval
+        self.calls = 0
+        self.set = False
+
+    def is_set(self):
+        if not self.set:
+            self.calls += 1
+            if self.calls % self.interval == 0:
+                self.set = self.event.is_set()
+        return self.set
+
+def split_search(board, pieces, split_depth):
+    # Yield the nodes split_depth placements deep as (board, depth, prefix,
+    # min_shift); each one is the root of an independent subtree
+    def walk(board, depth, prefix, min_shift):
+        if not board or depth == split_depth or depth == len(pieces):
+            yield board, depth, tuple(prefix), min_shift
+            return
+        piece_number, piece, shifts = pieces[depth]
+        free = ~board
+        next_is_same = depth + 1 < len(pieces) and pieces[depth + 1][1] == piece
+        for shift in shifts:
+            if shift < min_shift or (piece << shift) & free:
+                continue
+            prefix.append((piece_number, shift))
+            yield from walk(board ^ (piece << shift), depth + 1, prefix, shift + 1 if next_is_same else 0)
+            prefix.pop()
+
+    return walk(board, 0, [], 0)
+
+worker_state = {}
+
+def init_worker(cancel_event, pieces, engine, stride, tt_size, collect_stats=False, limits=None):
+    worker_state['cancel'] = PollingEvent(cancel_event)
+    worker_state['collect_stats'] = collect_stats
+    # limits is SearchBudget.share() for a budget used by the subtrees this
+    # worker is given, with its nodes counted together with the other
+    # workers'
+    if limits is not None:
+        timeout, node_budget, shared = limits
+        worker_state['budget'] = SearchBudget(timeout, node_budget, shared=shared)
+    else:
+        worker_state['budget'] = None
+    worker_state['pieces'] = pieces
+    worker_state['engine'] = engine
+    worker_state['prune'] = (stride, dead_region_tables(pieces)) if stride is not None else None
+    # Each worker keeps its own table across the subtrees it is given
+    worker_state['table'] = TranspositionTable(tt_size) if tt_size else None
+
+def solve_subtree(board, depth, prefix, min_shift, count_only, limit):
+    # Runs in a worker process; returns (solution_count, solutions, stats,
+    # stopped) with stats a SearchStats.to_dict() when the caller collects
+    # them and stopped the worker budget's stopped()
+    cancel = worker_state['cancel']
+    pieces = worker_state['pieces']
+    stats = SearchStats() if worker_state['collect_stats'] else None
+    budget = worker_state['budget']
+    if worker_state['engine'] == 'dlx':
+        remaining_pieces = pieces[depth:]
+        if min_shift and remaining_pieces:
+            # Later copies of the last placed shape must keep their shift order
+            same = remaining_pieces[0][1]
+            remaining_pieces = [(piece_number, piece, [shift for shift in shifts if shift >= min_shift] if piece == same else shifts)
+                                for piece_number, piece, shifts in remaining_pieces]
+        subtree = solve_dlx(board, remaining_pieces, cancel=cancel, stats=stats, budget=budget, prefix=prefix)
+    else:
+        subtree = solve_recursive(board, pieces, depth, list(prefix), min_shift, cancel, worker_state['prune'], worker_state['table'], stats, budget)
+
+    solution_count = 0
+    solutions = []
+    for solution in subtree:
+        solution_count += 1
+        if not count_only:
+            solutions.append(solution)
+        if limit is not None and solution_count >= limit:
+            break
+    subtree.close()
+    return solution_count, solutions, stats.to_dict() if stats is not None else None, budget.stopped() if budget is not None else None
+
+def run_parallel(board, pieces, engine, jobs, split_depth, count_only=False, limit=None, stride=None, tt_size=0, stats=None, budget=None):
+    # Yield (solution_count, solutions) for each finished subtree. Closing the
+    # generator early cancels every subtree that is still queued or running.
+    # The statistics of each finished subtree are merged into stats. Each
+    # worker gets a budget with the time left on budget, counting its nodes
+    # against budget's node budget together with the other workers, and the
+    # search stops once any of them runs out.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    context = multiprocessing.get_context()
+    cancel_event = context.Event()
+    limits = budget.share(context) if budget is not None else None
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=init_worker, initargs=(cancel_event, pieces, engine, stride, tt_size, stats is not None, limits)) as executor:
+        futures = [executor.submit(solve_subtree, sub_board, depth, prefix, min_shift, count_only, limit)
+                   for sub_board, depth, prefix, min_shift in split_search(board, pieces, split_depth)]
+        try:
+            for future in as_completed(futures):
+                solution_count, solutions, subtree_stats, stopped = future.result()
+                if stats is not None:
+                    stats.merge(subtree_stats)
+                if budget is not None:
+                    budget.merge(stopped)
+                yield solution_count, solutions
+                if budget is not None and budget.check():
+                    return
+        finally:
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+
+def iter_solutions_parallel(board, pieces, engine='dfs', jobs=None, split_depth=1, limit=None, stride=None, tt_size=0, stats=None, budget=None):
+    results = run_parallel(board, pieces, engine, jobs, split_depth, limit=limit, stride=stride, tt_size=tt_size, stats=stats, budget=budget)
+    try:
+        for solution_count, solutions in results:
+            yield from solutions
+    finally:
+        results.close()
+
+def count_solutions_parallel(board, pieces, engine='dfs', jobs=None, split_depth=1, limit=None, stride=None, tt_size=0, stats=None, budget=None):
+    total = 0
+    results = run_parallel(board, pieces, engine, jobs, split_depth, count_only=True, limit=limit, stride=stride, tt_size=tt_size, stats=stats, budget=budget)
+    try:
+        for solution_count, solutions in results:
+            total += solution_count
+            if limit is not None and total >= limit:
+                return limit
+    finally:
+        results.close()
+    return total
+
+def render_solution(solution, piece_map, rows, cols, max_row_length, use_color=False):
+    reset = RESET_COLOR + " " if use_color else " "
+    board_2d = [[reset for _ in range(cols)] for _ in range(rows)]
+    for piece_number, shift in solution:
+        place_piece_on_board(board_2d, piece_map[piece_number], shift, piece_number, max_row_length, use_color)
+    return board_2d
+
+def parse_piece(piece_str, board, max_length, board_grid=None):
+    # Returns (piece_array, piece_bitmap, piece, shifts). Placements are found
+    # with NumPy when board_grid comes from load_board_grid.
+    # Remove leading backslashes
+    piece_str = piece_str.replace('\\', '')
+    # Replace semicolons with commas
+    piece_str = piece_str.replace(';', '.')
+    piece_array = parse_board_or_piece(piece_str, max_length)
+    piece_bitmap = convert_to_1d_bitmap(piece_array)
+    piece = normalize_piece(bitmap_to_int(piece_bitmap))
+    if board_grid is not None:
+        shifts = find_piece_shifts_numpy(board_grid, piece_array)
+    else:
+        shifts = find_piece_shifts(board, piece)
+    return piece_array, piece_bitmap, piece, shifts
+
+def parse_puzzle(board_str, piece_strs, backend='auto'):
+    # Returns (board, pieces, board_array, max_length, piece_arrays) with
+    # pieces as (piece_number, piece, shifts) sorted by number of fits and
+    # piece_arrays mapping each piece number to its parsed rows. Raises
+    # ValueError on malformed input.
+    # Remove leading backslashes
+    board_str = board_str.replace('\\', '')
+    # Replace semicolons with commas
+    board_str = board_str.replace(';', '.')
+    try:
+        max_length = get_max_row_length(board_str)
+        board_array = parse_board_or_piece(board_str, max_length)
+    except ValueError as e:
+        raise ValueError(f"Error parsing board: {e}")
+    board = bitmap_to_int(convert_to_1d_bitmap(board_array))
+    board_grid = load_board_grid(board_array, backend, len(piece_strs))
+
+    pieces = []
+    piece_arrays = {}
+    for i, piece_str in enumerate(piece_strs):
+        try:
+            piece_array, piece_bitmap, piece, shifts = parse_piece(piece_str, board, max_length, board_grid)
+        except ValueError as e:
+            raise ValueError(f"Error parsing piece {i+1}: {e}")
+        pieces.append((i + 1, piece, shifts))
+        piece_arrays[i + 1] = piece_array
+
+    # Sort pieces by the number of fits (ascending order), keeping identical pieces together
+    pieces.sort(key=lambda x: (len(x[2]), x[1]))
+    return board, pieces, board_array, max_length, piece_arrays
+
+def check_areas(board, pieces):
+    # The pieces have to cover the board exactly
+    total_board_ones = board.bit_count()
+    total_piece_ones = sum(piece.bit_count() for _, piece, _ in pieces)
     if total_board_ones != total_piece_ones:
-        print(f"Error: The number of 1s in the board ({total_board_ones}) and pieces ({total_piece_ones}) are not equal.")
+        raise ValueError(f"The number of 1s in the board ({total_board_ones}) and pieces ({total_piece_ones}) are not equal.")
+
+def prepare_pieces(board, pieces, max_length, stride, symmetry=True, verbosity=0):
+    # Board symmetry only keeps one solution per orbit, so callers enumerating
+    # or counting every solution should pass symmetry=False
+    if not symmetry:
+        return pieces
+    pieces = break_symmetry(board, pieces, max_length, stride, verbosity)
+    pieces.sort(key=lambda x: (len(x[2]), x[1]))
+    return pieces
+
+def search_solutions(board, pieces, engine='dfs', stride=None, jobs=1, split_depth=1, limit=None, verbosity=0, table=None, stats=None, budget=None):
+    # Returns a closeable generator over at most limit solutions. jobs=None
+    # uses one worker per CPU; stride=None turns off dead-region pruning.
+    # Parallel workers build their own tables of table.max_size.
+    if jobs != 1:
+        return iter_solutions_parallel(board, pieces, engine, jobs, split_depth, limit, stride, table.max_size if table else 0, stats, budget)
+    return iter_solutions(board, pieces, engine, verbosity, stride, table, stats, budget)
+
+def count_solutions(board, pieces, engine='dfs', stride=None, jobs=1, split_depth=1, limit=None, verbosity=0, table=None, stats=None, budget=None):
+    if jobs != 1:
+        return count_solutions_parallel(board, pieces, engine, jobs, split_depth, limit, stride, table.max_size if table else 0, stats, budget)
+    search = iter_solutions(board, pieces, engine, verbosity, stride, table, stats, budget)
+    try:
+        return sum(1 for _ in itertools.islice(search, limit))
+    finally:
+        search.close()
+
+def cells_text(cells):
+    # Rows of '#' and '.' for a set of normalized cells
+    rows = max(r for r, _ in cells) + 1
+    cols = max(c for _, c in cells) + 1
+    return '/'.join(''.join('#' if (r, c) in cells else '.' for c in range(cols)) for r in range(rows))
+
+def canonical_puzzle(board, pieces, max_length, stride):
+    # Returns (text, cell_map, orientation) for the smallest text over the
+    # eight rotations and reflections of the board together with the pieces,
+    # since pieces are never rotated on their own. cell_map takes each board
+    # cell (row, col) to its cell in that orientation, and orientation holds
+    # the index in SYMMETRIES of the transform used with the pieces' texts in
+    # piece number order. Returns None for an empty board or piece, which are
+    # left out of the cache.
+    if not board or not all(piece for _, piece, _ in pieces):
+        return None
+    board_cells = bitboard_cells(board, stride)
+    min_row = min(r for r, _ in board_cells)
+    min_col = min(c for _, c in board_cells)
+    rows = max(r for r, _ in board_cells) - min_row + 1
+    cols = max(c for _, c in board_cells) - min_col + 1
+    shapes = [piece_shape(piece, max_length, stride) for _, piece, _ in sorted(pieces, key=lambda entry: entry[0])]
+
+    best = None
+    for orientation, transform in enumerate(SYMMETRIES):
+        cell_map = {(r, c): transform(r - min_row, c - min_col, rows, cols) for r, c in board_cells}
+        piece_texts = [cells_text(transform_cells(shape, transform)) for shape in shapes]
+        text = cells_text(set(cell_map.values())) + ';' + ';'.join(sorted(piece_texts))
+        if best is None or text < best[0]:
+            best = (text, cell_map, (orientation, piece_texts))
+    return best
+
+def pack_solution(solution, piece_map, cell_map, stride):
+    # A solution in canonical form: the cells of each placement
+    return [sorted(cell_map[cell] for cell in bitboard_cells(piece_map[piece_number] << shift, stride)) for piece_number, shift in solution]
+
+def unpack_solution(packed, pieces, cell_map, stride):
+    # Rebuild (piece_number, shift) placements for the caller's board.
+    # Identical pieces are interchangeable, so each placement goes to the
+    # next unused piece of its shape.
+    cells = {image: cell for cell, image in cell_map.items()}
+    unused = {}
+    for piece_number, piece, _ in sorted(pieces):
+        unused.setdefault(piece, []).append(piece_number)
+    solution = []
+    for placement_cells in packed:
+        placement = 0
+        for image in placement_cells:
+            r, c = cells[tuple(image)]
+            placement |= 1 << (r * stride + c)
+        shift = (placement & -placement).bit_length() - 1
+        solution.append((unused[placement >> shift].pop(0), shift))
+    return tuple(solution)
+
+def tangram_cache_key(board, pieces, max_length, stride, engine, limit, count_only, symmetry):
+    # Returns (key, cell_map), or None when the puzzle cannot be cached. A
+    # count is the same in every orientation, but a list of solutions comes
+    # out in an order that follows the orientation and the order of the
+    # pieces, so for a list those are part of the key.
+    canonical = canonical_puzzle(board, pieces, max_length, stride)
+    if canonical is None:
+        return None
+    text, cell_map, orientation = canonical
+    options = {'engine': engine, 'limit': limit, 'count_only': count_only, 'symmetry': symmetry}
+    if not count_only:
+        options['orientation'] = orientation
+    return puzzle_key('tangram', text, options), cell_map
+
+def solve_tangram(board, pieces, engine='dfs', limit=1, count_only=False, symmetry=None, prune=True, jobs=1, split_depth=1, tt_size=100000, backend='auto', cache=None, stats=None, budget=None, placements=None):
+    """Solve a tangram puzzle given its board string and piece strings.
+
+    Returns a dict with the solutions as tuples of (piece_number, shift)
+    placements, the solution count, and what render_solution needs to draw
+    them. limit=None finds every solution. Board symmetry breaking defaults
+    to on only when a single solution is wanted. Passing a
+    cache.SolutionCache reuses the result of any earlier solve of the same
+    puzzle, with 'cached' set in the result; a solution count is shared by
+    every rotation and reflection of the puzzle.
+    Passing a stats.SearchStats collects node counts and phase timings. A
+    limits.SearchBudget bounds the search by time, nodes or cancellation;
+    when it runs out, 'stopped' holds the reason and 'partial' the
+    placements of the most pieces placed at once, and nothing is cached.
+    placements is a dict kept by the caller across solves, so the parsed
+    board and piece placement tables of a puzzle seen before are reused.
+    """
+    with Phase(stats, 'parse'):
+        puzzle = (board, tuple(pieces), backend)
+        parsed = placements.get(puzzle) if placements is not None else None
+        if parsed is None:
+            parsed = parse_puzzle(board, pieces, backend)
+            if placements is not None:
+                placements[puzzle] = parsed
+        board, pieces, board_array, max_length, _ = parsed
+        pieces = list(pieces)
+        check_areas(board, pieces)
+
+    stride = len(board_array[0])
+    if symmetry is None:
+        symmetry = limit == 1 and not count_only
+    result = {
+        'rows': len(board_array),
+        'cols': stride,
+        'max_length': max_length,
+        'pieces': {piece_number: piece for piece_number, piece, _ in pieces},
+        'solutions': [],
+        'table': None,
+        'cached': False,
+        'stats': stats,
+        'stopped': None,
+        'partial': None,
+    }
+
+    with Phase(stats, 'cache'):
+        cache_key = tangram_cache_key(board, pieces, max_length, stride, engine, limit, count_only, symmetry) if cache is not None else None
+        if cache_key is not None:
+            key, cell_map = cache_key
+            stored = cache.get(key)
+    if cache_key is not None and stored is not None:
+        result['solutions'] = [unpack_solution(packed, pieces, cell_map, stride) for packed in stored['solutions']]
+        result['solution_count'] = stored['solution_count']
+        result['cached'] = True
+        return result
+
+    with Phase(stats, 'symmetry'):
+        pieces = prepare_pieces(board, pieces, max_length, stride, symmetry)
+    prune_stride = stride if prune else None
+    table = TranspositionTable(tt_size) if tt_size else None
+    result['table'] = table
+
+    with Phase(stats, 'search'):
+        if count_only:
+            result['solution_count'] = count_solutions(board, pieces, engine, prune_stride, jobs, split_depth, limit, table=table, stats=stats, budget=budget)
+        else:
+            search = search_solutions(board, pieces, engine, prune_stride, jobs, split_depth, limit, table=table, stats=stats, budget=budget)
+            try:
+                result['solutions'] = list(itertools.islice(search, limit))
+            finally:
+                search.close()
+            result['solution_count'] = len(result['solutions'])
+    if stats is not None:
+        stats.count('solutions', result['solution_count'])
+    if budget is not None and budget.reason is not None:
+        result['stopped'] = budget.reason
+        result['partial'] = tuple(budget.partial or ())
+        return result
+
+    if cache_key is not None:
+        packed = [pack_solution(solution, result['pieces'], cell_map, stride) for solution in result['solutions']]
+        cache.put(key, {'solutions': packed, 'solution_count': result['solution_count']})
+    return result
+
+def print_table_stats(table, verbosity):
+    if table is not None and verbosity >= 1 and table.hits + table.misses:
+        print(f"Transposition table: {table.hits} hits, {table.misses} misses, {len(table.entries)} dead states stored")
+
+def print_partial(budget, found, piece_map, rows, cols, max_length, use_color=False, verbosity=0, compact=False):
+    # Report a search stopped by its budget and, when it found no solution,
+    # the most pieces it had placed at once
+    print(f"Search stopped early ({budget.reason}) after {found} solution(s).")
+    if found:
+        return
+    if budget.partial:
+        print(f"Best partial state, {len(budget.partial)} of {len(piece_map)} pieces placed:")
+        print_bit_array(render_solution(budget.partial, piece_map, rows, cols, max_length, use_color), use_color=use_color, verbosity=verbosity, compact=compact)
+    else:
+        print("No piece was placed.")
+
+def main():
+    import argparse
+    from cli import CustomArgumentParser
+
+    parser = CustomArgumentParser(description='Solve tangram style grid puzzles')
+    parser.add_argument('-b', '--board', type=str, required=True, help='Board definition string.')
+    parser.add_argument('-p', '--pieces', type=str, nargs='*', help='Piece definition strings.')
+    parser.add_argument('-v', action='count', default=0, help='Increase verbosity level. Up to -vvv.')
+    parser.add_argument('-s', '--solve', action='store_true', help='Check if the puzzle is solvable. Returns 1st solution, not all..')
+    parser.add_argument('-c', '--color', action='store_true', help='Enable color coding for the pieces.')
+    parser.add_argument('-a', '--all', action='store_true', help='Print every solution instead of only the first.')
+    parser.add_argument('-n', '--count', action='store_true', help='Only count the solutions, without rendering them.')
+    parser.add_argument('-l', '--limit', type=int, default=None, help='Print up to this many solutions. Implies --solve.')
+    parser.add_argument('--no-symmetry', action='store_true', help='Disable symmetry breaking for symmetric boards. Only used when a single solution is wanted.')
+    parser.add_argument('-e', '--engine', choices=['dfs', 'dlx'], default='dfs', help='Search engine: piece-by-piece backtracking (dfs) or exact cover with dancing links (dlx).')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes to search with (default: 1, 0 for one per CPU).')
+    parser.add_argument('--no-prune', action='store_true', help='Disable dead-region pruning in the dfs engine.')
+    parser.add_argument('--tt-size', type=int, default=100000, help='Maximum number of dead search states remembered by the dfs engine (default: 100000, 0 to disable).')
+    parser.add_argument('--backend', choices=['auto', 'python', 'numpy'], default='auto', help='How piece placements are found. auto uses NumPy for large puzzles when it is installed.')
+    parser.add_argument('--split-depth', type=int, default=1, help='Number of pieces placed before the search is split between workers (default: 1).')
+    parser.add_argument('--cache', type=str, nargs='?', const='', default=None, metavar='PATH', help='Reuse and store solutions in a cache file (default path: $XDG_CACHE_HOME/puzzle-solvers/solutions.sqlite, with ~/.cache when XDG_CACHE_HOME is not set).')
+    parser.add_argument('--stats', choices=['text', 'json'], default=None, help='Print search counters and phase timings at the end, as text or JSON.')
+    parser.add_argument('--timeout', type=float, default=None, help='Stop searching after this many seconds and show the best partial state.')
+    parser.add_argument('--node-budget', type=int, default=None, help='Stop searching after this many search nodes, counted over all worker processes with --jobs, and show the best partial state.')
+    parser.add_argument('--compact', action='store_true', help="Print each board on one line, cells separated by ',' and rows by '.', without color.")
+
+    try:
+        args = parser.parse_args()
+    except argparse.ArgumentError as e:
+        print(f"Error parsing arguments: {e}")
         exit()
 
-    pieces_sorted = [(piece_number, piece_bitmap) for piece_number, piece_bitmap, fits in piece_fits]
-    reset = RESET_COLOR + " " if args.color else " "
-    board_2d = [[reset for _ in range(len(board_array[0]))] for _ in range(len(board_array))]
-    if not solve_recursive(board_bitmap, pieces_sorted, max_length, [], board_2d, args.v, args.color):
-        print("No solution found.")
+    if args.backend == 'numpy' and load_board_grid([[0]], 'numpy') is None:
+        print("NumPy is not installed, using the python backend.")
+
+    # Compact boards are meant for other programs and are never colored
+    use_color = args.color and not args.compact
+    stats = SearchStats() if args.stats else None
+    budget = SearchBudget(args.timeout, args.node_budget) if args.timeout is not None or args.node_budget is not None else None
+    try:
+        with Phase(stats, 'parse'):
+            board, pieces_sorted, board_array, max_length, piece_arrays = parse_puzzle(args.board, args.pieces or [], args.backend)
+    except ValueError as e:
+        # Enhance the error message with additional information
+        error_message = str(e)
+        if any(part.startswith('-') for part in args.board.split(',')):
+            error_message += " If an argument starts with a '-', please escape it with a '\\'."
+        print(error_message)
+        exit()
+
+    board_bitmap = convert_to_1d_bitmap(board_array)
+    print("Board:")
+    print_bit_array(board_array, use_color=use_color, compact=args.compact)
+
+    if args.v >= 1:
+        print("1D Board Bitmap:")
+        print_1d_bitmap(board_bitmap)
+
+    if args.v >= 3:
+        for piece_number, piece, shifts in sorted(pieces_sorted):
+            count_piece_fits(board, piece, len(board_bitmap), args.v)
+
+    for piece_number, piece, shifts in pieces_sorted:
+        piece_array = piece_arrays[piece_number]
+        print(f"\nPiece {piece_number}:")
+        print_bit_array(piece_array, piece_number, use_color=use_color, verbosity=args.v, compact=args.compact)
+        if args.v >= 1:
+            print(f"1D Piece {piece_number} Bitmap:")
+            print_1d_bitmap(convert_to_1d_bitmap(piece_array))
+        print(f"Piece {piece_number} fits {len(shifts)} times in the board.")
+
+    if args.solve or args.all or args.count or args.limit is not None:
+        try:
+            check_areas(board, pieces_sorted)
+        except ValueError as e:
+            print(f"Error: {e}")
+            exit()
+
+        limit = args.limit
+        if limit is None and not (args.all or args.count):
+            limit = 1
+        # Board symmetry only keeps one solution per orbit, so it would skew the
+        # results whenever more than the first solution is wanted
+        symmetry = not args.no_symmetry and limit == 1 and not args.count
+        piece_map = {piece_number: piece for piece_number, piece, shifts in pieces_sorted}
+
+        # A puzzle solved before comes straight from the cache, and a count
+        # of one solved in any orientation
+        with Phase(stats, 'cache'):
+            cache = open_cache(args.cache or None, args.cache is not None)
+            cache_key = None
+            if cache is not None:
+                cache_key = tangram_cache_key(board, pieces_sorted, max_length, len(board_array[0]), args.engine, limit, args.count, symmetry)
+            stored = cache.get(cache_key[0]) if cache_key is not None else None
+        if stored is not None:
+            print(f"Solutions loaded from cache {cache.path}.")
+            solution_count = stored['solution_count']
+            search = (unpack_solution(packed, pieces_sorted, cache_key[1], len(board_array[0])) for packed in stored['solutions'])
+            table = None
+        else:
+            with Phase(stats, 'symmetry'):
+                pieces_sorted = prepare_pieces(board, pieces_sorted, max_length, len(board_array[0]), symmetry, args.v)
+
+            jobs = args.jobs if args.jobs > 0 else None
+            stride = None if args.no_prune else len(board_array[0])
+            table = TranspositionTable(args.tt_size) if args.tt_size > 0 else None
+
+            if args.count:
+                with Phase(stats, 'search'):
+                    solution_count = count_solutions(board, pieces_sorted, args.engine, stride, jobs, args.split_depth, limit, args.v, table, stats, budget)
+            else:
+                search = search_solutions(board, pieces_sorted, args.engine, stride, jobs, args.split_depth, limit, args.v, table, stats, budget)
+
+        # A stopped search may have missed solutions, so it is not cached
+        stopped = budget is not None and budget.reason is not None
+        if args.count:
+            print(f"Solutions found: {solution_count}")
+            if stopped:
+                print_partial(budget, solution_count, piece_map, len(board_array), len(board_array[0]), max_length, use_color, args.v, args.compact)
+            print_table_stats(table, args.v)
+            if cache_key is not None and stored is None and not stopped:
+                cache.put(cache_key[0], {'solutions': [], 'solution_count': solution_count})
+            if cache is not None:
+                cache.close()
+            if stats is not None:
+                stats.count('solutions', solution_count)
+            report(stats, args.stats)
+            return
+
+        solved = []
+        solution_count = 0
+        with Phase(stats, 'search'):
+            for solution in itertools.islice(search, limit):
+                solved.append(solution)
+                solution_count += 1
+                with Phase(stats, 'render'):
+                    board_2d = render_solution(solution, piece_map, len(board_array), len(board_array[0]), max_length, use_color)
+                    if args.all or args.limit is not None:
+                        print(f"Solution {solution_count}:")
+                    else:
+                        print("Solution found:")
+                    print_bit_array(board_2d, use_color=use_color, verbosity=args.v, compact=args.compact)
+                    if args.v >= 1:
+                        print(f"Placements: {list(solution)}")
+            search.close()
+        stopped = budget is not None and budget.reason is not None
+        if stopped:
+            print_partial(budget, solution_count, piece_map, len(board_array), len(board_array[0]), max_length, use_color, args.v, args.compact)
+        elif solution_count == 0:
+            print("No solution found.")
+        print_table_stats(table, args.v)
+        if cache_key is not None and stored is None and not stopped:
+            packed = [pack_solution(solution, piece_map, cache_key[1], len(board_array[0])) for solution in solved]
+            cache.put(cache_key[0], {'solutions': packed, 'solution_count': solution_count})
+        if cache is not None:
+            cache.close()
+        if stats is not None:
+            stats.count('solutions', solution_count)
+        report(stats, args.stats)
+
+if __name__ == "__main__":
+    main()